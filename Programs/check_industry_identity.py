@@ -12,6 +12,7 @@ Uses the same data source and industry filtering as note.py.
 import numpy as np
 import pandas as pd
 from stats_can import StatsCan
+from statscan_cache import cached_table
 
 sc = StatsCan()
 
@@ -91,7 +92,7 @@ print("=" * 72)
 print("STEP 1: Fetch Table 36-10-0217-01 and list all variables")
 print("=" * 72)
 
-df_raw = sc.table_to_df('36-10-0217-01')
+df_raw = cached_table(sc, '36-10-0217-01')
 
 var_col = 'Multifactor productivity and related variables'
 all_vars = sorted(df_raw[var_col].unique())
@@ -126,12 +127,11 @@ df = df_raw.copy()
 df = df[~df['North American Industry Classification System (NAICS)'].isin(DROP_LIST)]
 df = df[df[var_col].isin(VARS_TO_FETCH)]
 
-# Pivot to wide: one row per (industry, year)
-df = df.pivot_table(
-    index=['North American Industry Classification System (NAICS)', 'REF_DATE'],
-    columns=var_col,
-    values='VALUE'
-).reset_index().rename_axis(None, axis=1)
+# Pivot to wide: one row per (industry, year). Each (industry, year,
+# variable) cell is unique, so a plain unstack needs no aggregation.
+df = df.set_index(
+    ['North American Industry Classification System (NAICS)', 'REF_DATE', var_col]
+)['VALUE'].unstack(var_col).reset_index().rename_axis(None, axis=1)
 
 df = df.rename(columns={
     'North American Industry Classification System (NAICS)': 'industry',
@@ -1,9 +1,13 @@
 # Import libraries
 import os
+import json
 import dotenv
+from multiprocessing import Pool
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
@@ -11,227 +15,373 @@ dotenv.load_dotenv()
 # Define the path to the project's directory
 path = os.getenv('path')
 
-# For reproducibility
-np.random.seed(42)
-
 # Parameters for panel simulation
 n_firms = 1000 # Number of unique firms
+n_chunks = 8 # Number of firm chunks simulated in parallel and written one at a time (each with its own random stream)
 available_years = np.arange(2000, 2018)
+first_incorporation_year = 1990 # Earliest year in which firms can be incorporated
+save_csv = False # Also save the dataset to CSV (slower and larger than Parquet)
+
+# Precompute the first day (in days since 1970-01-01) and the length of every year in which dates are drawn
+date_years = (np.arange(first_incorporation_year, available_years[-1] + 1) - 1970).astype('datetime64[Y]')
+year_start_days = date_years.astype('datetime64[D]').astype(np.int64)
+# Use December 28 as the end of the year for simplicity to avoid month-end issues
+year_len_days = (date_years + np.timedelta64(11, 'M')).astype('datetime64[D]').astype(np.int64) + 27 - year_start_days
+
+# Helper function to generate a random date (in days since 1970-01-01) within each of the given years
+def random_date_in_year(rng, years):
+    idx = np.asarray(years) - first_incorporation_year
+    return year_start_days[idx] + rng.integers(0, year_len_days[idx])
+
+# Helper function to draw values uniformly from an array of categories (optionally stored as a categorical)
+def sim_categorical(rng, values, size, as_category=False):
+    codes = rng.integers(0, len(values), size)
+    if as_category:
+        return pd.Categorical.from_codes(codes, categories=values)
+    return values[codes]
+
+# Helper function for monetary variables using a lognormal distribution (in single precision)
+def sim_monetary(rng, mean_log, sigma, size):
+    return np.exp(mean_log + sigma * rng.standard_normal(size, dtype=np.float32))
+
+# Helper functions for uniform and centered normal variables (in single precision)
+def sim_uniform(rng, low, high, size):
+    return low + (high - low) * rng.random(size, dtype=np.float32)
+
+def sim_normal(rng, scale, size):
+    return scale * rng.standard_normal(size, dtype=np.float32)
 
-# Helper function to generate a random date within a given year
-def random_date_in_year(year, start_month=1, end_month=12):
-    start = datetime(year, start_month, 1)
-    # Use day 28 for simplicity to avoid month-end issues
-    end = datetime(year, end_month, 28)
-    return start + timedelta(days=np.random.randint(0, (end - start).days))
+# Helper function to draw between one and three distinct codes (and their values) per observation
+def gen_list_and_values(rng, codes, size):
+    n_codes = len(codes)
+    k = rng.integers(1, 4, size)
+    # Draw three distinct positions per observation by skipping over the positions already drawn
+    first = rng.integers(0, n_codes, size)
+    second = rng.integers(0, n_codes - 1, size)
+    second += second >= first
+    third = rng.integers(0, n_codes - 2, size)
+    third += third >= np.minimum(first, second)
+    third += third >= np.maximum(first, second)
+    # Store the first k codes of each observation as a list (offsets into the flattened codes)
+    positions = np.column_stack([first, second, third])[np.arange(3) < k[:, None]]
+    offsets = np.concatenate([[0], np.cumsum(k)]).astype(np.int32)
+    code_lists = pd.arrays.ArrowExtensionArray(pa.ListArray.from_arrays(offsets, pa.array(codes[positions])))
+    # Only keep the values of the first k codes
+    vals = sim_monetary(rng, 10, 1.0, (size, 3))
+    vals[np.arange(3) >= k[:, None]] = np.nan
+    return code_lists, vals[:, 0], vals[:, 1], vals[:, 2]
 
-# Helper function for monetary variables using a lognormal distribution
-def sim_monetary(mean_log, sigma):
-    return np.random.lognormal(mean=mean_log, sigma=sigma)
+# Helper function to expand firms into one observation per year between their entry and exit years
+def expand_panel(entry_year, exit_year):
+    lengths = exit_year - entry_year + 1
+    firm_idx = np.repeat(np.arange(len(entry_year)), lengths)
+    obs_year = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + entry_year[firm_idx]
+    return firm_idx, obs_year
 
 # Define categorical lists and constants
-provinces = ['AB', 'BC', 'MB', 'NB', 'NL', 'NS', 'NT', 'NU', 'ON', 'PE', 'QC', 'SK', 'YT']
-legal_types = ['1', '2', '3', '4', '5', '6', '9']
-nonprofit_codes = [0, 1, 2]
-boolean_flags = [0, -1]
-naics_codes = [str(i).zfill(2) for i in range(11, 100)]
-ownership_gender = [0, 1, 2, 3]
-foreign_country_codes = ['US', 'MX', 'GB', 'FR', 'DE', 'JP']
-
-# Create a list of unique firm IDs
-firm_ids = [f'FIRM{str(i).zfill(5)}' for i in range(n_firms)]
-
-# Container for panel data rows
-rows = []
-
-# Simulate panel data: each firm is observed continuously from its entry year to its exit year.
-for firm in firm_ids:
+provinces = np.array(['AB', 'BC', 'MB', 'NB', 'NL', 'NS', 'NT', 'NU', 'ON', 'PE', 'QC', 'SK', 'YT'])
+legal_types = np.array(['1', '2', '3', '4', '5', '6', '9'])
+nonprofit_codes = np.array([0, 1, 2], dtype=np.int8)
+boolean_flags = np.array([0, -1], dtype=np.int8)
+naics_codes = np.char.zfill(np.arange(11, 100).astype(str), 2)
+ownership_gender = np.array([0, 1, 2, 3], dtype=np.int8)
+foreign_country_codes = np.array(['US', 'MX', 'GB', 'FR', 'DE', 'JP'])
+product_codes = np.arange(10, 100).astype(str)
+
+# Lognormal parameters (mean and standard deviation of the log) of the monetary variables
+monetary_params = {
+    'T4_Payroll': (12, 0.8),
+    'total_assets': (16, 0.9),
+    'total_liabilities': (15, 0.9),
+    'total_shareholder_equity': (15, 1.0),
+    'total_current_assets': (15, 0.9),
+    'total_tangible_assets': (15, 1.0),
+    'total_intangible_assets': (14, 1.0),
+    'total_current_liabilities': (14, 1.0),
+    'land': (12, 1.0),
+    'buildings': (13, 1.0),
+    'machinery_and_equipment': (13, 1.0),
+    'total_revenue': (15, 0.9),
+    'total_expenses': (15, 0.9),
+    'farm_total_revenue': (13, 1.0),
+    'farm_total_expenses': (13, 1.0),
+    'total_cost_of_sales': (14, 0.9),
+    'gross_profits': (14, 0.9),
+    'sales_goods_and_services': (15, 0.9),
+    'opening_inventory': (12, 1.0),
+    'closing_inventory': (12, 1.0),
+    'total_operating_expenses': (14, 1.0),
+    'amortization_tangible_assets': (11, 1.0),
+    'amortization_intangible_assets': (11, 1.0),
+    'SRED_Expenditures': (10, 1.0),
+    'SRED_ITC_Earned': (10, 1.0),
+    'SRED_ITC_Current_at_35Percent': (10, 1.0),
+    'SRED_ITC_Capital_at_35Percent': (10, 1.0),
+    'SRED_ITC_Current_at_20Percent': (10, 1.0),
+    'SRED_ITC_Capital_at_20Percent': (10, 1.0),
+    'SRED_Deducted_PartI': (10, 1.0),
+    'SRED_from_partnership': (10, 1.0),
+    'SRED_refunded': (10, 1.0),
+    'SRED_carried_back_1year': (10, 1.0),
+    'SRED_carried_back_2years': (10, 1.0),
+    'SRED_carried_back_3years': (10, 1.0),
+    'Purchases_cost_of_materials': (14, 1.0),
+    'capital_cost_allowance': (11, 1.0),
+    'investment_BLDG': (10, 1.0),
+    'investment_ME': (10, 1.0),
+    'investment_INTANGIBLE': (10, 1.0),
+    'investment_NOCLASS': (10, 1.0),
+    'investment_JUNK': (10, 1.0),
+    'total_exports': (10, 1.0),
+    'total_imports': (10, 1.0),
+    'RD_out': (10, 1.0),
+    'RD_inv': (10, 1.0),
+    'RD_purchase': (10, 1.0),
+    'RD_thirdparty': (10, 1.0),
+    'RD_inhouse': (10, 1.0),
+    'L0534_0': (10, 1.0),
+    'L0536_0': (10, 1.0),
+    'L0430_0': (10, 1.0),
+    'L0517_0': (10, 1.0),
+    'L0518_0': (10, 1.0),
+    'L0432_0': (10, 1.0),
+    'L0380_0': (10, 1.0),
+    'L0502_0': (10, 1.0),
+    'L0390_0': (10, 1.0),
+    'L0504_0': (10, 1.0),
+    'L0340_0': (10, 1.0),
+    'L0345_0': (10, 1.0),
+    'L0370_0': (10, 1.0),
+}
+
+# Create an array of unique firm IDs
+firm_ids = np.char.add('FIRM', np.char.zfill(np.arange(n_firms).astype(str), 5))
+
+# Simulate the panel data of a chunk of firms (given by their positions in firm_ids) with a given random stream
+def simulate_panel(firms, seed):
+    rng = np.random.default_rng(seed)
+
     # Select an entry year randomly from available years
-    entry_year = np.random.choice(available_years)
+    entry_idx = rng.integers(0, len(available_years), len(firms))
     # Select an exit year uniformly from all available years at or after the entry year
-    possible_exit_years = available_years[available_years >= entry_year]
-    exit_year = np.random.choice(possible_exit_years)
-    
+    exit_idx = rng.integers(entry_idx, len(available_years))
+    entry_year, exit_year = available_years[entry_idx], available_years[exit_idx]
+
     # Randomly assign an incorporation year (must be on or before the entry year)
-    incorporation_year = np.random.choice(np.arange(1990, entry_year + 1))
-    incorporation_date = random_date_in_year(incorporation_year)
-    
-    # Generate one observation for each year from entry_year to exit_year (unbalanced panel)
-    for obs_year in range(entry_year, exit_year + 1):
-        row = {}
-        row['EntID'] = firm
-        # Fiscal dates are generated within the observation year
-        row['FiscalStartDate'] = random_date_in_year(obs_year)
-        # FiscalEndDate is set 300-400 days after FiscalStartDate
-        row['FiscalEndDate'] = row['FiscalStartDate'] + pd.to_timedelta(np.random.randint(300, 400), unit='d')
-        # Incorporation date remains constant for the firm
-        row['IncorporationDate'] = incorporation_date
-
-        # ---------------- Base Variables ----------------
-        # T4_Payroll: total payroll – using lognormal; median roughly exp(12) ~ 1.6e5
-        row['T4_Payroll'] = sim_monetary(12, 0.8)
-        # Average employees from PD7; using Poisson to get a count (plus 1 to avoid zero)
-        row['PD7_AvgEmp_12'] = np.random.poisson(lam=50) + 1
-        row['PD7_AvgEmp_NonZero'] = np.random.poisson(lam=40) + 1
-
-        # Total assets: scale to a median around several million dollars
-        row['total_assets'] = sim_monetary(16, 0.9)
-        row['total_liabilities'] = sim_monetary(15, 0.9)
-        row['total_shareholder_equity'] = sim_monetary(15, 1.0)
-        row['total_current_assets'] = sim_monetary(15, 0.9)
-        row['total_tangible_assets'] = sim_monetary(15, 1.0)
-        # Accumulated amortization as a fraction of tangible assets
-        row['tot_acum_amort_tangible_assets'] = row['total_tangible_assets'] * np.random.uniform(0.1, 0.5)
-        row['total_intangible_assets'] = sim_monetary(14, 1.0)
-        row['tot_acum_amort_intang_assets'] = row['total_intangible_assets'] * np.random.uniform(0.1, 0.5)
-        row['total_current_liabilities'] = sim_monetary(14, 1.0)
-        # For land, buildings, and machinery, use lower means
-        row['land'] = sim_monetary(12, 1.0)
-        row['buildings'] = sim_monetary(13, 1.0)
-        row['machinery_and_equipment'] = sim_monetary(13, 1.0)
-        # Revenue and expenses
-        row['total_revenue'] = sim_monetary(15, 0.9)
-        row['total_expenses'] = sim_monetary(15, 0.9)
-        # Farming revenue/expenses (smaller scale)
-        row['farm_total_revenue'] = sim_monetary(13, 1.0)
-        row['farm_total_expenses'] = sim_monetary(13, 1.0)
-        # Farm net income: set as difference plus some noise
-        row['farm_net_income'] = row['farm_total_revenue'] - row['farm_total_expenses'] + np.random.normal(0, 1e5)
-        row['total_cost_of_sales'] = sim_monetary(14, 0.9)
-        row['gross_profits'] = sim_monetary(14, 0.9)
-        # Net income before tax/extraneous items: allow negative values
-        row['net_income_befor_taxextraitems'] = np.random.normal(0, 1e6)
-        row['sales_goods_and_services'] = sim_monetary(15, 0.9)
-        row['net_income_after_taxextraitems'] = np.random.normal(0, 1e6)
-        row['opening_inventory'] = sim_monetary(12, 1.0)
-        row['closing_inventory'] = sim_monetary(12, 1.0)
-        row['total_operating_expenses'] = sim_monetary(14, 1.0)
-        row['amortization_tangible_assets'] = sim_monetary(11, 1.0)
-        row['amortization_intangible_assets'] = sim_monetary(11, 1.0)
-        # SR&ED expenditures and related items; using a lower scale
-        row['SRED_Expenditures'] = sim_monetary(10, 1.0)
-        row['SRED_ITC_Earned'] = sim_monetary(10, 1.0)
-        row['SRED_ITC_Current_at_35Percent'] = sim_monetary(10, 1.0)
-        row['SRED_ITC_Capital_at_35Percent'] = sim_monetary(10, 1.0)
-        row['SRED_ITC_Current_at_20Percent'] = sim_monetary(10, 1.0)
-        row['SRED_ITC_Capital_at_20Percent'] = sim_monetary(10, 1.0)
-        row['SRED_Deducted_PartI'] = sim_monetary(10, 1.0)
-        row['SRED_from_partnership'] = sim_monetary(10, 1.0)
-        row['SRED_refunded'] = sim_monetary(10, 1.0)
-        row['SRED_carried_back_1year'] = sim_monetary(10, 1.0)
-        row['SRED_carried_back_2years'] = sim_monetary(10, 1.0)
-        row['SRED_carried_back_3years'] = sim_monetary(10, 1.0)
-        row['OPAddressProvince'] = np.random.choice(provinces)
-        row['LegalTypeCode'] = np.random.choice(legal_types)
-        row['NonProfitCode'] = np.random.choice(nonprofit_codes)
-        row['NAICS'] = np.random.choice(naics_codes)
-        row['EntMultiEstablishmentFlag'] = np.random.choice(boolean_flags)
-        row['EntMultiLocationFlag'] = np.random.choice(boolean_flags)
-        row['EntMultiProvinceFlag'] = np.random.choice(boolean_flags)
-        row['EntMultiActivityFlag'] = np.random.choice(boolean_flags)
-        # BirthDate: choose a date between incorporation and the fiscal start date
-        row['BirthDate'] = random_date_in_year(max(incorporation_year, row['FiscalStartDate'].year))
-        row['BusinessStatusCode'] = np.random.randint(0, 8)
-        row['Purchases_cost_of_materials'] = sim_monetary(14, 1.0)
-        row['capital_cost_allowance'] = sim_monetary(11, 1.0)
-        row['NbBN_filedT4'] = np.random.randint(0, 10)
-        row['NbBN_filedPD7'] = np.random.randint(0, 10)
-        row['NbBN_filedT2'] = np.random.randint(0, 10)
-        row['CCPC'] = np.random.randint(0, 2)
-        
-        # ---------------- Analytic Variables ----------------
-        # Gross output is defined as the sum of total_revenue and farm_total_revenue.
-        row['gross_output'] = row['total_revenue'] + row['farm_total_revenue']
-        # Value-added measures: using definitions from the data dictionary.
-        # value_added_cca = net_income_befor_taxextraitems + T4_Payroll + capital_cost_allowance
-        row['value_added_cca'] = max(row['net_income_befor_taxextraitems'] + row['T4_Payroll'] + row['capital_cost_allowance'], 0)
-        # value_added_amort = net_income_befor_taxextraitems + T4_Payroll + amortization_tangible_assets
-        row['value_added_amort'] = max(row['net_income_befor_taxextraitems'] + row['T4_Payroll'] + row['amortization_tangible_assets'], 0)
-        row['int_inputs_cca'] = row['gross_output'] - row['value_added_cca']
-        row['int_inputs_amort'] = row['gross_output'] - row['value_added_amort']
-        row['lp_go'] = row['gross_output'] / (row['PD7_AvgEmp_12'] + 1)
-        row['lp_va_cca'] = row['value_added_cca'] / (row['PD7_AvgEmp_12'] + 1)
-        row['lp_va_amort'] = row['value_added_amort'] / (row['PD7_AvgEmp_12'] + 1)
-        row['total_tangible_net_stock'] = row['total_tangible_assets'] - row['tot_acum_amort_tangible_assets']
-        row['total_intangible_net_stock'] = row['total_intangible_assets'] - row['tot_acum_amort_intang_assets']
-        row['total_assets_d'] = row['total_assets'] if row['total_assets'] > 0 else 0
-        row['total_liabilities_d'] = row['total_liabilities'] if row['total_liabilities'] > 0 else 0
-        row['total_current_assets_d'] = row['total_current_assets'] if row['total_current_assets'] > 0 else 0
-        row['total_current_liabilities_d'] = row['total_current_liabilities'] if row['total_current_liabilities'] > 0 else 0
-        row['total_expenses_d'] = row['total_expenses'] if row['total_expenses'] > 0 else 0
-        row['farm_total_expenses_d'] = row['farm_total_expenses'] if row['farm_total_expenses'] > 0 else 0
-        row['total_cost_of_sales_d'] = row['total_cost_of_sales'] if row['total_cost_of_sales'] > 0 else 0
-        row['sales_goods_and_services_d'] = row['sales_goods_and_services'] if row['sales_goods_and_services'] > 0 else 0
-        row['total_operating_expenses_d'] = row['total_operating_expenses'] if row['total_operating_expenses'] > 0 else 0
-        row['amortization_tangible_assets_d'] = row['amortization_tangible_assets'] if row['amortization_tangible_assets'] > 0 else 0
-        row['amortization_intangible_assets_d'] = row['amortization_intangible_assets'] if row['amortization_intangible_assets'] > 0 else 0
-        # Investment variables: simulated on a lower scale
-        row['investment_BLDG'] = sim_monetary(10, 1.0)
-        row['investment_ME'] = sim_monetary(10, 1.0)
-        row['investment_INTANGIBLE'] = sim_monetary(10, 1.0)
-        row['investment_NOCLASS'] = sim_monetary(10, 1.0)
-        row['investment_JUNK'] = sim_monetary(10, 1.0)
-        row['total_tangible_net_investment'] = (row['investment_BLDG'] + row['investment_ME'] +
-                                                row['investment_NOCLASS'] + row['investment_JUNK'])
-        row['CountryOfControl_Nalmf'] = 'CAN'
-        row['OwnershipGender'] = np.random.choice(ownership_gender)
-        # Age is calculated as the difference between the fiscal start year and the incorporation year.
-        row['age'] = row['FiscalStartDate'].year - row['IncorporationDate'].year
-        row['NAICS_DOMINANT'] = np.random.choice(naics_codes)
-        
-        # ---------------- TEC (Exports) Variables ----------------
-        def gen_list_and_values(codes):
-            k = np.random.randint(1, 4)
-            code_list = ','.join(np.random.choice(codes, k, replace=False))
-            vals = [sim_monetary(10, 1.0) for _ in range(k)]
-            while len(vals) < 3:
-                vals.append(np.nan)
-            return code_list, vals[0], vals[1], vals[2]
-        
-        export_countries, row['first_export_country_value'], row['second_export_country_value'], row['third_export_country_value'] = gen_list_and_values(foreign_country_codes)
-        row['list_of_export_countries'] = export_countries
-        export_products, row['first_export_product_value'], row['second_export_product_value'], row['third_export_product_value'] = gen_list_and_values([str(x) for x in range(10, 100)])
-        row['list_of_export_products'] = export_products
-        row['total_exports'] = sim_monetary(10, 1.0)
-        
-        # ---------------- TIC (Imports) Variables ----------------
-        import_countries, row['first_import_country_value'], row['second_import_country_value'], row['third_import_country_value'] = gen_list_and_values(foreign_country_codes)
-        row['list_of_import_countries'] = import_countries
-        import_products, row['first_import_product_value'], row['second_import_product_value'], row['third_import_product_value'] = gen_list_and_values([str(x) for x in range(10, 100)])
-        row['list_of_import_products'] = import_products
-        row['total_imports'] = sim_monetary(10, 1.0)
-        
-        # ---------------- SR&ED Expenditures Variables ----------------
-        row['RD_out'] = sim_monetary(10, 1.0)
-        row['RD_inv'] = sim_monetary(10, 1.0)
-        row['RD_purchase'] = sim_monetary(10, 1.0)
-        row['RD_thirdparty'] = sim_monetary(10, 1.0)
-        row['RD_inhouse'] = sim_monetary(10, 1.0)
-        row['L0534_0'] = sim_monetary(10, 1.0)
-        row['L0536_0'] = sim_monetary(10, 1.0)
-        row['L0430_0'] = sim_monetary(10, 1.0)
-        row['L0517_0'] = sim_monetary(10, 1.0)
-        row['L0518_0'] = sim_monetary(10, 1.0)
-        row['L0432_0'] = sim_monetary(10, 1.0)
-        row['L0380_0'] = sim_monetary(10, 1.0)
-        row['L0502_0'] = sim_monetary(10, 1.0)
-        row['L0390_0'] = sim_monetary(10, 1.0)
-        row['L0504_0'] = sim_monetary(10, 1.0)
-        row['L0340_0'] = sim_monetary(10, 1.0)
-        row['L0345_0'] = sim_monetary(10, 1.0)
-        row['L0370_0'] = sim_monetary(10, 1.0)
-        
-        # ---------------- KLEMS Variables ----------------
-        row['IFPA'] = np.random.uniform(0.8, 1.2)
-        row['IFPK'] = np.random.uniform(0.8, 1.2)
-        row['IFPL'] = np.random.uniform(0.8, 1.2)
-        row['IFPV'] = np.random.uniform(0.8, 1.2)
-        
-        rows.append(row)
-
-# Create the DataFrame from the list of rows
-df = pd.DataFrame(rows)
-print(df.head())
-
-# Optionally, save the dataset to CSV
-df.to_csv(os.path.join(path, 'Data/synthetic.csv'), index=False)
\ No newline at end of file
+    incorporation_year = rng.integers(first_incorporation_year, entry_year + 1)
+    incorporation_days = random_date_in_year(rng, incorporation_year)
+
+    # Expand the firms into one observation for each year from entry_year to exit_year (unbalanced panel)
+    firm_idx, obs_year = expand_panel(entry_year, exit_year)
+    N = len(firm_idx)
+
+    # Draw all lognormal monetary variables from a single block of standard normal shocks
+    mu, sigma = np.array(list(monetary_params.values())).T
+    shocks = rng.standard_normal((len(monetary_params), N), dtype=np.float32)
+    shocks *= sigma[:, None]
+    shocks += mu[:, None]
+    monetary = dict(zip(monetary_params, np.exp(shocks, out=shocks)))
+
+    # Simulate panel data: each variable is drawn for all observations at once
+    cols = {}
+    cols['EntID'] = pd.Categorical.from_codes(firms[firm_idx], categories=firm_ids)
+    # Fiscal dates are generated within the observation year (in days since 1970-01-01)
+    fiscal_start_days = random_date_in_year(rng, obs_year)
+    cols['FiscalStartDate'] = fiscal_start_days
+    # FiscalEndDate is set 300-400 days after FiscalStartDate
+    cols['FiscalEndDate'] = fiscal_start_days + rng.integers(300, 400, N)
+    # Incorporation date remains constant for the firm
+    cols['IncorporationDate'] = incorporation_days[firm_idx]
+
+    # ---------------- Base Variables ----------------
+    # T4_Payroll: total payroll – using lognormal; median roughly exp(12) ~ 1.6e5
+    cols['T4_Payroll'] = monetary['T4_Payroll']
+    # Average employees from PD7; using Poisson to get a count (plus 1 to avoid zero)
+    cols['PD7_AvgEmp_12'] = rng.poisson(lam=50, size=N).astype(np.int32) + 1
+    cols['PD7_AvgEmp_NonZero'] = rng.poisson(lam=40, size=N).astype(np.int32) + 1
+
+    # Total assets: scale to a median around several million dollars
+    cols['total_assets'] = monetary['total_assets']
+    cols['total_liabilities'] = monetary['total_liabilities']
+    cols['total_shareholder_equity'] = monetary['total_shareholder_equity']
+    cols['total_current_assets'] = monetary['total_current_assets']
+    cols['total_tangible_assets'] = monetary['total_tangible_assets']
+    # Accumulated amortization as a fraction of tangible assets
+    cols['tot_acum_amort_tangible_assets'] = cols['total_tangible_assets'] * sim_uniform(rng, 0.1, 0.5, N)
+    cols['total_intangible_assets'] = monetary['total_intangible_assets']
+    cols['tot_acum_amort_intang_assets'] = cols['total_intangible_assets'] * sim_uniform(rng, 0.1, 0.5, N)
+    cols['total_current_liabilities'] = monetary['total_current_liabilities']
+    # For land, buildings, and machinery, use lower means
+    cols['land'] = monetary['land']
+    cols['buildings'] = monetary['buildings']
+    cols['machinery_and_equipment'] = monetary['machinery_and_equipment']
+    # Revenue and expenses
+    cols['total_revenue'] = monetary['total_revenue']
+    cols['total_expenses'] = monetary['total_expenses']
+    # Farming revenue/expenses (smaller scale)
+    cols['farm_total_revenue'] = monetary['farm_total_revenue']
+    cols['farm_total_expenses'] = monetary['farm_total_expenses']
+    # Farm net income: set as difference plus some noise
+    cols['farm_net_income'] = cols['farm_total_revenue'] - cols['farm_total_expenses'] + sim_normal(rng, 1e5, N)
+    cols['total_cost_of_sales'] = monetary['total_cost_of_sales']
+    cols['gross_profits'] = monetary['gross_profits']
+    # Net income before tax/extraneous items: allow negative values
+    cols['net_income_befor_taxextraitems'] = sim_normal(rng, 1e6, N)
+    cols['sales_goods_and_services'] = monetary['sales_goods_and_services']
+    cols['net_income_after_taxextraitems'] = sim_normal(rng, 1e6, N)
+    cols['opening_inventory'] = monetary['opening_inventory']
+    cols['closing_inventory'] = monetary['closing_inventory']
+    cols['total_operating_expenses'] = monetary['total_operating_expenses']
+    cols['amortization_tangible_assets'] = monetary['amortization_tangible_assets']
+    cols['amortization_intangible_assets'] = monetary['amortization_intangible_assets']
+    # SR&ED expenditures and related items; using a lower scale
+    cols['SRED_Expenditures'] = monetary['SRED_Expenditures']
+    cols['SRED_ITC_Earned'] = monetary['SRED_ITC_Earned']
+    cols['SRED_ITC_Current_at_35Percent'] = monetary['SRED_ITC_Current_at_35Percent']
+    cols['SRED_ITC_Capital_at_35Percent'] = monetary['SRED_ITC_Capital_at_35Percent']
+    cols['SRED_ITC_Current_at_20Percent'] = monetary['SRED_ITC_Current_at_20Percent']
+    cols['SRED_ITC_Capital_at_20Percent'] = monetary['SRED_ITC_Capital_at_20Percent']
+    cols['SRED_Deducted_PartI'] = monetary['SRED_Deducted_PartI']
+    cols['SRED_from_partnership'] = monetary['SRED_from_partnership']
+    cols['SRED_refunded'] = monetary['SRED_refunded']
+    cols['SRED_carried_back_1year'] = monetary['SRED_carried_back_1year']
+    cols['SRED_carried_back_2years'] = monetary['SRED_carried_back_2years']
+    cols['SRED_carried_back_3years'] = monetary['SRED_carried_back_3years']
+    cols['OPAddressProvince'] = sim_categorical(rng, provinces, N, as_category=True)
+    cols['LegalTypeCode'] = sim_categorical(rng, legal_types, N, as_category=True)
+    cols['NonProfitCode'] = sim_categorical(rng, nonprofit_codes, N)
+    cols['NAICS'] = sim_categorical(rng, naics_codes, N, as_category=True)
+    cols['EntMultiEstablishmentFlag'] = sim_categorical(rng, boolean_flags, N)
+    cols['EntMultiLocationFlag'] = sim_categorical(rng, boolean_flags, N)
+    cols['EntMultiProvinceFlag'] = sim_categorical(rng, boolean_flags, N)
+    cols['EntMultiActivityFlag'] = sim_categorical(rng, boolean_flags, N)
+    # BirthDate: choose a date between incorporation and the fiscal start date
+    cols['BirthDate'] = random_date_in_year(rng, np.maximum(incorporation_year[firm_idx], obs_year))
+    cols['BusinessStatusCode'] = rng.integers(0, 8, N, dtype=np.int8)
+    cols['Purchases_cost_of_materials'] = monetary['Purchases_cost_of_materials']
+    cols['capital_cost_allowance'] = monetary['capital_cost_allowance']
+    cols['NbBN_filedT4'] = rng.integers(0, 10, N, dtype=np.int8)
+    cols['NbBN_filedPD7'] = rng.integers(0, 10, N, dtype=np.int8)
+    cols['NbBN_filedT2'] = rng.integers(0, 10, N, dtype=np.int8)
+    cols['CCPC'] = rng.integers(0, 2, N, dtype=np.int8)
+
+    # ---------------- Analytic Variables ----------------
+    # Gross output is defined as the sum of total_revenue and farm_total_revenue.
+    cols['gross_output'] = cols['total_revenue'] + cols['farm_total_revenue']
+    # Value-added measures: using definitions from the data dictionary.
+    # value_added_cca = net_income_befor_taxextraitems + T4_Payroll + capital_cost_allowance
+    cols['value_added_cca'] = np.maximum(cols['net_income_befor_taxextraitems'] + cols['T4_Payroll'] + cols['capital_cost_allowance'], 0.0)
+    # value_added_amort = net_income_befor_taxextraitems + T4_Payroll + amortization_tangible_assets
+    cols['value_added_amort'] = np.maximum(cols['net_income_befor_taxextraitems'] + cols['T4_Payroll'] + cols['amortization_tangible_assets'], 0.0)
+    cols['int_inputs_cca'] = cols['gross_output'] - cols['value_added_cca']
+    cols['int_inputs_amort'] = cols['gross_output'] - cols['value_added_amort']
+    # Labor productivity measures share the inverse of employment (plus one)
+    inv_emp = 1.0 / (cols['PD7_AvgEmp_12'] + 1).astype(np.float32)
+    cols['lp_go'] = cols['gross_output'] * inv_emp
+    cols['lp_va_cca'] = cols['value_added_cca'] * inv_emp
+    cols['lp_va_amort'] = cols['value_added_amort'] * inv_emp
+    cols['total_tangible_net_stock'] = cols['total_tangible_assets'] - cols['tot_acum_amort_tangible_assets']
+    cols['total_intangible_net_stock'] = cols['total_intangible_assets'] - cols['tot_acum_amort_intang_assets']
+    # Censor the following variables at zero
+    for var in ['total_assets', 'total_liabilities', 'total_current_assets', 'total_current_liabilities',
+                'total_expenses', 'farm_total_expenses', 'total_cost_of_sales', 'sales_goods_and_services',
+                'total_operating_expenses', 'amortization_tangible_assets', 'amortization_intangible_assets']:
+        cols[var + '_d'] = np.maximum(cols[var], 0.0)
+    # Investment variables: simulated on a lower scale
+    cols['investment_BLDG'] = monetary['investment_BLDG']
+    cols['investment_ME'] = monetary['investment_ME']
+    cols['investment_INTANGIBLE'] = monetary['investment_INTANGIBLE']
+    cols['investment_NOCLASS'] = monetary['investment_NOCLASS']
+    cols['investment_JUNK'] = monetary['investment_JUNK']
+    # Accumulate the tangible net investment in place to avoid intermediate arrays
+    cols['total_tangible_net_investment'] = cols['investment_BLDG'] + cols['investment_ME']
+    cols['total_tangible_net_investment'] += cols['investment_NOCLASS']
+    cols['total_tangible_net_investment'] += cols['investment_JUNK']
+    cols['CountryOfControl_Nalmf'] = pd.Categorical.from_codes(np.zeros(N, dtype=np.int8), categories=['CAN'])
+    cols['OwnershipGender'] = sim_categorical(rng, ownership_gender, N)
+    # Age is calculated as the difference between the fiscal start year (the observation year) and the incorporation year.
+    cols['age'] = obs_year - incorporation_year[firm_idx]
+    cols['NAICS_DOMINANT'] = sim_categorical(rng, naics_codes, N, as_category=True)
+
+    # ---------------- TEC (Exports) Variables ----------------
+    export_countries, cols['first_export_country_value'], cols['second_export_country_value'], cols['third_export_country_value'] = gen_list_and_values(rng, foreign_country_codes, N)
+    cols['list_of_export_countries'] = export_countries
+    export_products, cols['first_export_product_value'], cols['second_export_product_value'], cols['third_export_product_value'] = gen_list_and_values(rng, product_codes, N)
+    cols['list_of_export_products'] = export_products
+    cols['total_exports'] = monetary['total_exports']
+
+    # ---------------- TIC (Imports) Variables ----------------
+    import_countries, cols['first_import_country_value'], cols['second_import_country_value'], cols['third_import_country_value'] = gen_list_and_values(rng, foreign_country_codes, N)
+    cols['list_of_import_countries'] = import_countries
+    import_products, cols['first_import_product_value'], cols['second_import_product_value'], cols['third_import_product_value'] = gen_list_and_values(rng, product_codes, N)
+    cols['list_of_import_products'] = import_products
+    cols['total_imports'] = monetary['total_imports']
+
+    # ---------------- SR&ED Expenditures Variables ----------------
+    cols['RD_out'] = monetary['RD_out']
+    cols['RD_inv'] = monetary['RD_inv']
+    cols['RD_purchase'] = monetary['RD_purchase']
+    cols['RD_thirdparty'] = monetary['RD_thirdparty']
+    cols['RD_inhouse'] = monetary['RD_inhouse']
+    cols['L0534_0'] = monetary['L0534_0']
+    cols['L0536_0'] = monetary['L0536_0']
+    cols['L0430_0'] = monetary['L0430_0']
+    cols['L0517_0'] = monetary['L0517_0']
+    cols['L0518_0'] = monetary['L0518_0']
+    cols['L0432_0'] = monetary['L0432_0']
+    cols['L0380_0'] = monetary['L0380_0']
+    cols['L0502_0'] = monetary['L0502_0']
+    cols['L0390_0'] = monetary['L0390_0']
+    cols['L0504_0'] = monetary['L0504_0']
+    cols['L0340_0'] = monetary['L0340_0']
+    cols['L0345_0'] = monetary['L0345_0']
+    cols['L0370_0'] = monetary['L0370_0']
+
+    # ---------------- KLEMS Variables ----------------
+    cols['IFPA'] = sim_uniform(rng, 0.8, 1.2, N)
+    cols['IFPK'] = sim_uniform(rng, 0.8, 1.2, N)
+    cols['IFPL'] = sim_uniform(rng, 0.8, 1.2, N)
+    cols['IFPV'] = sim_uniform(rng, 0.8, 1.2, N)
+
+    # Convert the dates from days since 1970-01-01 to datetimes
+    for var in ['FiscalStartDate', 'FiscalEndDate', 'IncorporationDate', 'BirthDate']:
+        cols[var] = cols[var].astype('datetime64[D]')
+
+    # Create the DataFrame from the simulated columns without copying them
+    return pd.DataFrame(cols, copy=False)
+
+# Helper function to simulate a (firms, seed) chunk in a worker process
+def simulate_chunk(chunk):
+    return simulate_panel(*chunk)
+
+if __name__ == '__main__':
+    # Simulate chunks of firms in parallel with independent random streams (for reproducibility)
+    seeds = np.random.SeedSequence(42).spawn(n_chunks)
+    chunks = zip(np.array_split(np.arange(n_firms), n_chunks), seeds)
+    list_vars = ['list_of_export_countries', 'list_of_export_products', 'list_of_import_countries', 'list_of_import_products']
+    writer = None
+    # Close the Parquet writer even if a chunk fails so that its file handle is released
+    try:
+        with Pool(min(n_chunks, os.cpu_count())) as pool:
+            # Write each chunk as soon as it is simulated so that only a few chunks are held in memory
+            for i, df in enumerate(pool.imap(simulate_chunk, chunks)):
+                if i == 0:
+                    print(df.head())
+
+                # Save the chunk to Parquet, storing the lists of codes as plain Arrow list columns
+                # (their pandas dtype is dropped from the schema metadata so that pd.read_parquet can read them back)
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                pandas_meta = json.loads(table.schema.metadata[b'pandas'])
+                pandas_meta['columns'] = [col for col in pandas_meta['columns'] if col['name'] not in list_vars]
+                table = table.replace_schema_metadata({**table.schema.metadata, b'pandas': json.dumps(pandas_meta).encode()})
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(path, 'Data/synthetic.parquet'), table.schema, compression='zstd')
+                writer.write_table(table)
+
+                # Optionally, save the chunk to CSV (with the lists of codes joined by commas)
+                if save_csv:
+                    df_csv = df.assign(**{var: pc.binary_join(pa.array(df[var]), ',') for var in list_vars})
+                    df_csv.to_csv(os.path.join(path, 'Data/synthetic.csv'), mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    finally:
+        if writer is not None:
+            writer.close()
@@ -3,11 +3,106 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 from stats_can import StatsCan
+from statscan_cache import cached_table
 from scipy import sparse
+from scipy.linalg import solve
+from joblib import Parallel, delayed
 
 # Initialize the StatsCan API
 sc = StatsCan()
 
+# Define a function to load a Statistics Canada I-O workbook in long form, caching it to parquet
+def load_iot_sheet(path, rows_slice, cols_slice):
+    # Read the cached table if it is more recent than the workbook (the crop slices are part of the cache name so that changing them invalidates it)
+    crop = '_'.join(str(bound) for bound in (rows_slice.start, rows_slice.stop, cols_slice.start, cols_slice.stop))
+    cache = path.with_name(path.stem + ' rows-cols ' + crop + '.parquet')
+    if cache.exists() and cache.stat().st_mtime >= path.stat().st_mtime:
+        return pd.read_parquet(cache)
+
+    # Load the rows of the "Domestic" sheet with the Rust-based calamine reader, which handles both xls and xlsx workbooks
+    sheet = pd.read_excel(path, sheet_name='Domestic', header=None, engine='calamine').iloc[rows_slice, :].reset_index(drop=True)
+
+    # Drop useless rows and columns
+    df = sheet.iloc[2:, cols_slice]
+    df.columns = sheet.iloc[0, cols_slice].values
+    df.insert(0, 'supply_naics', sheet.iloc[2:, 1].values)
+
+    # Reshape the data
+    df = pd.melt(
+        df,
+        id_vars='supply_naics',
+        var_name='use_naics',
+        value_name='value'
+    )
+
+    # Store the codes as Arrow strings and convert the values to float
+    df['supply_naics'] = df['supply_naics'].astype('string[pyarrow]')
+    df['use_naics'] = df['use_naics'].astype('string[pyarrow]')
+    df['value'] = pd.to_numeric(df['value'], errors='coerce')
+
+    # Cache the data frame
+    df.to_parquet(cache, compression='zstd')
+
+    return df
+
+# Define a function to create an index with all possible combinations of years and codes, sorted by year, use code and supply code
+def full_grid(codes, years):
+    codes = sorted(codes)
+    return pd.MultiIndex.from_product([years, codes, codes], names=['year', 'use_naics_agg', 'supply_naics_agg'])
+
+# Define a function to calculate the cost shares of the I-O flows on sparse (year, use)-by-supply matrices
+# (the sparse form is only an intermediate: the long-form result is later reindexed onto the dense full grid)
+def sparse_cost_shares(df, codes, years):
+    # Map the years and codes to row and column positions, dropping the flows outside of the grid
+    codes = sorted(codes)
+    year_pos = pd.Index(years).get_indexer(df['year'])
+    use_pos = pd.Index(codes).get_indexer(df['use_naics_agg'])
+    supply_pos = pd.Index(codes).get_indexer(df['supply_naics_agg'])
+    keep = (year_pos >= 0) & (use_pos >= 0) & (supply_pos >= 0)
+
+    # Build the sparse matrix of the flows, summing duplicate entries and sorting them in canonical row order
+    M = sparse.coo_matrix((df['value'].fillna(0).to_numpy()[keep], (year_pos[keep] * len(codes) + use_pos[keep], supply_pos[keep])), shape=(len(years) * len(codes), len(codes)))
+    M.sum_duplicates()
+
+    # Divide the flows by the total cost of their row, leaving the rows that sum to zero at zero
+    total = np.asarray(M.sum(axis=1)).ravel()
+    inv_total = np.divide(1, total, out=np.zeros_like(total), where=total != 0)
+
+    return pd.DataFrame({
+        'year': np.asarray(years)[M.row // len(codes)],
+        'use_naics_agg': np.asarray(codes)[M.row % len(codes)],
+        'supply_naics_agg': np.asarray(codes)[M.col],
+        'value': M.data,
+        'cost_share': M.data * inv_total[M.row]
+    })
+
+# Define a function to create the capital or labor cost rows of the I-O tables
+def kl_rows(df_cl_year, which):
+    df = df_cl_year[['year', 'naics', which + '_cost']].rename(columns={'naics': 'use_naics_agg', which + '_cost': 'value'})
+    df['supply_naics_agg'] = which
+    df['value'] = df['value'] * 1000
+    return df
+
+# Define a function to convert a mapping into an Arrow string series for vectorized lookups
+def to_lookup(mapping):
+    return pd.Series(list(mapping.values()), index=pd.Index(list(mapping.keys()), dtype='string[pyarrow]'), dtype='string[pyarrow]')
+
+# Define a function to accumulate commodity-by-industry values into a dense year-by-commodity-by-industry array and flag the industries present in each year
+def code_tensor(year_codes, commodity_codes, naics_codes, values, shape):
+    keep = (year_codes >= 0) & (year_codes < shape[0])
+    tensor = np.zeros(shape)
+    np.add.at(tensor, (year_codes[keep], commodity_codes[keep], naics_codes[keep]), values[keep])
+    present = np.zeros((shape[0], shape[2]), dtype=bool)
+    present[year_codes[keep], naics_codes[keep]] = True
+    return tensor, present
+
+# Define a function to calculate the Leontief-adjusted lambda's and the cost-revenue wedges of a given year
+def solve_year(Omega_tilde, Omega, b):
+    lambda_tilde = solve(np.eye(Omega_tilde.shape[0]) - Omega_tilde.T, b, check_finite=False)
+    Omega_rows = Omega[:-2, :-2].sum(axis=1)
+    wedge = (Omega_tilde[:-2, :-2] @ Omega_rows) / (Omega[:-2, :-2] @ Omega_rows)
+    return lambda_tilde, wedge
+
 # Define a dictionary to map industry names to their corresponding NAICS codes
 industry_to_naics = {
     'Accommodation and food services [72]': '72',
@@ -293,12 +388,18 @@ naics_agg_61_08 = {
     'Wood product manufacturing': '321'
 }
 
+# Convert the mappings to lookup series
+industry_to_naics_map = to_lookup(industry_to_naics)
+naics_agg_map = to_lookup(naics_agg)
+naics_agg_97_08_map = to_lookup(naics_agg_97_08)
+naics_agg_61_08_map = to_lookup(naics_agg_61_08)
+
 ########################################################################
 # Prepare the Table 36-10-0217-01 Statistics Canada data               # 
 ########################################################################
 
 # Retrieve the data from Table 36-10-0217-01
-df_cl = sc.table_to_df('36-10-0217-01')
+df_cl = cached_table(sc, '36-10-0217-01')
 
 # Drop several sectors and industries
 drop_list = [
@@ -327,10 +428,9 @@ df_cl = df_cl[~df_cl['North American Industry Classification System (NAICS)'].is
 # Keep the relevant variables
 df_cl = df_cl[df_cl['Multifactor productivity and related variables'].isin(['Gross output', 'Gross domestic product (GDP)', 'Capital cost', 'Labour compensation',])]
 
-# Reshape the DataFrame
-df_cl = df_cl.pivot_table(index=['North American Industry Classification System (NAICS)', 'REF_DATE'], 
-                          columns='Multifactor productivity and related variables', 
-                          values='VALUE').reset_index().rename_axis(None, axis=1)
+# Reshape the DataFrame (each industry, date and variable cell is unique, so unstack needs no aggregation)
+df_cl = df_cl.set_index(['North American Industry Classification System (NAICS)', 'REF_DATE', 'Multifactor productivity and related variables'])['VALUE'].unstack(
+    'Multifactor productivity and related variables').reset_index().rename_axis(None, axis=1)
 
 # Rename the columns
 df_cl = df_cl.rename(columns={
@@ -348,14 +448,21 @@ df_cl = df_cl.drop(columns=['date'])
 df_cl = df_cl[df_cl['year'] < 2020]
 
 # Map the industry name to the NAICS code
-df_cl['naics'] = df_cl['industry'].map(industry_to_naics)
+df_cl['naics'] = df_cl['industry'].map(industry_to_naics_map)
+
+# Create the capital and labor cost rows of the I-O tables for each year
+cap_by_year = {year: kl_rows(g, 'capital') for year, g in df_cl.groupby('year')}
+lab_by_year = {year: kl_rows(g, 'labor') for year, g in df_cl.groupby('year')}
+
+# Index the capital and labor data of each year by industry
+cl_by_year = {year: g.set_index('naics') for year, g in df_cl.groupby('year', sort=False)}
 
 ########################################################################
 # Prepare the Table 36-10-0001-01 Statistics Canada data (2013-2019)   # 
 ########################################################################
 
 # Retrieve the data from Table 36-10-0001-01
-df = sc.table_to_df('36-10-0001-01')
+df = cached_table(sc, '36-10-0001-01')
 
 # Restrict on basic prices
 df = df[df['Valuation'] == 'Basic price']
@@ -363,264 +470,123 @@ df = df[df['Valuation'] == 'Basic price']
 # Keep the relevant columns
 df = df[['REF_DATE', 'Supply', 'Use', 'VALUE']].rename(columns={'REF_DATE': 'date', 'Supply': 'supply', 'Use': 'use', 'VALUE': 'value'})
 
+# Store the supply and use labels as Arrow strings
+df = df.astype({'supply': 'string[pyarrow]', 'use': 'string[pyarrow]'})
+
 # Recode the date column to year
 df['year'] = df['date'].dt.year
 df = df.drop(columns=['date'])
 df = df[df['year'] < 2020]
 
-# Identify the "supply" and "use" codes
+# Identify the "supply" and "use" codes and drop the labels
 df['supply_naics'] = df['supply'].str[-9:-1]
 df['use_naics'] = df['use'].str[-9:-1]
+df = df.drop(columns=['supply', 'use'])
 
-# Only keep the supply and use codes that start with "BS" (business sector)
-df = df[df['supply_naics'].str.startswith('BS')]
-df = df[df['use_naics'].str.startswith('BS')]
-
-# Drop the supply and use codes "BS551113" and "BS610000"
-df = df[~df['supply_naics'].isin(['BS551113', 'BS610000'])]
-df = df[~df['use_naics'].isin(['BS551113', 'BS610000'])]
+# Only keep the supply and use codes that start with "BS" (business sector), except "BS551113" and "BS610000"
+drop_set = frozenset({'BS551113', 'BS610000'})
+df = df[df['supply_naics'].str.startswith('BS', na=False) & df['use_naics'].str.startswith('BS', na=False) & ~df['supply_naics'].isin(drop_set) & ~df['use_naics'].isin(drop_set)]
 
-# Define aggregated codes at the 3-digit NAICS level
+# Define aggregated codes at the 3-digit NAICS level and drop the detailed codes
 df['supply_naics_agg'] = df['supply_naics'].str[2:5]
 df['use_naics_agg'] = df['use_naics'].str[2:5]
+df = df[['supply_naics_agg', 'use_naics_agg', 'year', 'value']]
 
-# Aggregate the data frame at the 3-digit NAICS level
-df = df.groupby(['supply_naics_agg', 'use_naics_agg', 'year'], as_index=False).agg({'value': 'sum'})
-
-# Map the aggregation grouping
-df.loc[df['supply_naics_agg'].isin(naics_agg.keys()), 'supply_naics_agg'] = df.loc[df['supply_naics_agg'].isin(naics_agg.keys()), 'supply_naics_agg'].map(naics_agg)
-df.loc[df['use_naics_agg'].isin(naics_agg.keys()), 'use_naics_agg'] = df.loc[df['use_naics_agg'].isin(naics_agg.keys()), 'use_naics_agg'].map(naics_agg)
+# Map the aggregation grouping, keeping the codes without a mapping
+df['supply_naics_agg'] = df['supply_naics_agg'].map(naics_agg_map).fillna(df['supply_naics_agg'])
+df['use_naics_agg'] = df['use_naics_agg'].map(naics_agg_map).fillna(df['use_naics_agg'])
 
 # Aggregate the data frame at the coarser 3-digit NAICS level
 df = df.groupby(['supply_naics_agg', 'use_naics_agg', 'year'], as_index=False).agg({'value': 'sum'})
 
-# Create a DataFrame with all possible combinations of codes
+# List the codes of the I-O table and include the capital and labor costs
 all_naics = list(set(df['supply_naics_agg'].unique()) | set(df['use_naics_agg'].unique())) + ['capital', 'labor']
-df_all = pd.DataFrame([(supply, use, year) for supply in all_naics for use in all_naics for year in range(2013, 2019 + 1)], columns=['supply_naics_agg', 'use_naics_agg', 'year'])
-df = pd.merge(df_all, df, on=['supply_naics_agg', 'use_naics_agg', 'year'], how='left')
-
-# Include the capital and labor costs
-df_capital = df_cl[['capital_cost', 'naics', 'year']].rename(columns={'naics': 'use_naics_agg'})
-df_capital['supply_naics_agg'] = 'capital'
-df_capital['capital_cost'] = df_capital['capital_cost'] * 1000
-df = pd.merge(df, df_capital, on=['use_naics_agg', 'supply_naics_agg', 'year'], how='left')
-df.loc[(df['supply_naics_agg'] == 'capital') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'value'] = df.loc[(df['supply_naics_agg'] == 'capital') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'capital_cost']
-df = df.drop(columns=['capital_cost'])
-df_labor = df_cl[['labor_cost', 'naics', 'year']].rename(columns={'naics': 'use_naics_agg'})
-df_labor['supply_naics_agg'] = 'labor'
-df_labor['labor_cost'] = df_labor['labor_cost'] * 1000
-df = pd.merge(df, df_labor, on=['supply_naics_agg', 'use_naics_agg', 'year'], how='left')
-df.loc[(df['supply_naics_agg'] == 'labor') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'value'] = df.loc[(df['supply_naics_agg'] == 'labor') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'labor_cost']
-df = df.drop(columns=['labor_cost'])
-
-# Fill in the missing values with 0
-df.loc[df['value'].isna(), 'value'] = 0
-
-# Calculate the cost share of each industry
-df['cost_share'] = df.groupby(['year', 'use_naics_agg'])['value'].transform(lambda x: x / x.sum())
-df.loc[df['cost_share'].isna(), 'cost_share'] = 0
-
-# Sort the data frame by year, use_naics_agg, and supply_naics_agg
-df_13_19 = df.sort_values(by=['year', 'use_naics_agg', 'supply_naics_agg'])
+df = pd.concat([df, kl_rows(df_cl, 'capital'), kl_rows(df_cl, 'labor')], ignore_index=True)
+
+# Calculate the cost share of each industry on the sparse use-by-supply matrices of the I-O flows
+df = sparse_cost_shares(df, all_naics, range(2013, 2019 + 1))
+
+# Store the data frame
+df_13_19 = df
 
 ########################################################################
 # Prepare the I-O tables from Statistics Canada data for 2010-2012     # 
 ########################################################################
 
-# Create an empty DataFrame
-df_10_12 = pd.DataFrame()
-
-# Iterate over the years 2010 to 2012
-for year in range(2010, 2012 + 1):
+# Define a function to prepare the I-O table of a given year
+def process_year_10_12(year, cap, lab, naics_agg_map):
     # Load the data
-    df = pd.read_excel(os.path.join(Path(os.getcwd()).parent, 'Data', 'IOTs national symmetric domestic and imports L97 ' + str(year) + '.xlsx'), sheet_name="Domestic", header=None)
-
-    # Drop useless rows and columns
-    df = df.iloc[10:, :].drop(index=11).reset_index(drop=True)
-    df = df.drop(df.columns[[0, 2]], axis=1).iloc[:, :-1]
-
-    # Reshape the data
-    df.columns = df.iloc[0]
-    df = df[1:].reset_index(drop=True)
-    df = df.rename(columns={df.columns[0]: 'supply_naics'})
-    df = pd.melt(
-        df,
-        id_vars='supply_naics',
-        var_name='use_naics',
-        value_name='value'
-    )
-
-    # Convert the values to float
-    df['value'] = pd.to_numeric(df['value'], errors='coerce')
-
-    # Only keep the supply and use codes that start with "BS" (business sector)
-    df = df[df['supply_naics'].str.startswith('BS')]
-    df = df[df['use_naics'].str.startswith('BS')]
+    df = load_iot_sheet(Path(os.getcwd()).parent / 'Data' / ('IOTs national symmetric domestic and imports L97 ' + str(year) + '.xlsx'), slice(10, None), slice(3, -1))
 
-    # Drop the supply and use codes "BS551113" and "BS610000"
-    df = df[~df['supply_naics'].isin(['BS551113', 'BS610000'])]
-    df = df[~df['use_naics'].isin(['BS551113', 'BS610000'])]
+    # Only keep the supply and use codes that start with "BS" (business sector), except "BS551113" and "BS610000"
+    df = df[df['supply_naics'].str.startswith('BS', na=False) & df['use_naics'].str.startswith('BS', na=False) & ~df['supply_naics'].isin(drop_set) & ~df['use_naics'].isin(drop_set)]
 
-    # Define aggregated codes at the 3-digit NAICS level
+    # Define aggregated codes at the 3-digit NAICS level and drop the detailed codes
     df['supply_naics_agg'] = df['supply_naics'].str[2:5]
     df['use_naics_agg'] = df['use_naics'].str[2:5]
+    df = df[['supply_naics_agg', 'use_naics_agg', 'value']]
 
-    # Aggregate the data frame at the 3-digit NAICS level
-    df = df.groupby(['supply_naics_agg', 'use_naics_agg'], as_index=False).agg({'value': 'sum'})
-
-    # Map the aggregation grouping
-    df.loc[df['supply_naics_agg'].isin(naics_agg.keys()), 'supply_naics_agg'] = df.loc[df['supply_naics_agg'].isin(naics_agg.keys()), 'supply_naics_agg'].map(naics_agg)
-    df.loc[df['use_naics_agg'].isin(naics_agg.keys()), 'use_naics_agg'] = df.loc[df['use_naics_agg'].isin(naics_agg.keys()), 'use_naics_agg'].map(naics_agg)
+    # Map the aggregation grouping, keeping the codes without a mapping
+    df['supply_naics_agg'] = df['supply_naics_agg'].map(naics_agg_map).fillna(df['supply_naics_agg'])
+    df['use_naics_agg'] = df['use_naics_agg'].map(naics_agg_map).fillna(df['use_naics_agg'])
 
     # Aggregate the data frame at the coarser 3-digit NAICS level
     df = df.groupby(['supply_naics_agg', 'use_naics_agg'], as_index=False).agg({'value': 'sum'})
 
-    # Create a DataFrame with all possible combinations of codes
+    # List the codes of the I-O table and include the capital and labor costs
     all_naics = list(set(df['supply_naics_agg'].unique()) | set(df['use_naics_agg'].unique())) + ['capital', 'labor']
-    df_all = pd.DataFrame([(supply, use) for supply in all_naics for use in all_naics], columns=['supply_naics_agg', 'use_naics_agg'])
-    df = pd.merge(df_all, df, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-
-    # Include the capital and labor costs
-    df_capital = df_cl.loc[df_cl['year'] == year, ['capital_cost', 'naics']].rename(columns={'naics': 'use_naics_agg'})
-    df_capital['supply_naics_agg'] = 'capital'
-    df_capital['capital_cost'] = df_capital['capital_cost'] * 1000
-    df = pd.merge(df, df_capital, on=['use_naics_agg', 'supply_naics_agg'], how='left')
-    df.loc[(df['supply_naics_agg'] == 'capital') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'value'] = df.loc[(df['supply_naics_agg'] == 'capital') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'capital_cost']
-    df = df.drop(columns=['capital_cost'])
-    df_labor = df_cl.loc[df_cl['year'] == year, ['labor_cost', 'naics']].rename(columns={'naics': 'use_naics_agg'})
-    df_labor['supply_naics_agg'] = 'labor'
-    df_labor['labor_cost'] = df_labor['labor_cost'] * 1000
-    df = pd.merge(df, df_labor, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-    df.loc[(df['supply_naics_agg'] == 'labor') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'value'] = df.loc[(df['supply_naics_agg'] == 'labor') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'labor_cost']
-    df = df.drop(columns=['labor_cost'])
-
-    # Fill in the missing values with 0
-    df.loc[df['value'].isna(), 'value'] = 0
-
-    # Calculate the cost share of each industry
-    df['cost_share'] = df.groupby('use_naics_agg')['value'].transform(lambda x: x / x.sum())
-    df.loc[df['cost_share'].isna(), 'cost_share'] = 0
-
-    # Sort the data frame by year, use_naics_agg, and supply_naics_agg
-    df = df.sort_values(by=['use_naics_agg', 'supply_naics_agg'])
+    df = pd.concat([df.assign(year=year), cap, lab], ignore_index=True)
 
-    # Create the year column
-    df['year'] = year
+    # Calculate the cost share of each industry on the sparse use-by-supply matrices of the I-O flows
+    df = sparse_cost_shares(df, all_naics, [year])
 
-    # Append the data to the DataFrame
-    df_10_12 = pd.concat([df_10_12, df], ignore_index=True)
+    return df
 
-# Sort the data frame by year, use_naics_agg, and supply_naics_agg
-df_10_12 = df_10_12.sort_values(by=['year', 'use_naics_agg', 'supply_naics_agg'])
+# Prepare the I-O tables of the years 2010 to 2012 in parallel
+parts_10_12 = Parallel(n_jobs=min(3, os.cpu_count()), backend='loky')(delayed(process_year_10_12)(year, cap_by_year[year], lab_by_year[year], naics_agg_map) for year in range(2010, 2012 + 1))
+df_10_12 = pd.concat(parts_10_12, ignore_index=True)
 
 ########################################################################
 # Prepare the I-O table from Statistics Canada data for 2009           # 
 ########################################################################
 
 # Load the data
-df = pd.read_excel(os.path.join(Path(os.getcwd()).parent, 'Data', 'IOTs national symmetric domestic and imports L61 2009.xls'), sheet_name="Domestic", header=None)
-
-# Drop useless rows and columns
-df = df.iloc[10:, :].drop(index=11).reset_index(drop=True)
-df = df.drop(df.columns[[0, 2]], axis=1).iloc[:, :-1]
-
-# Reshape the data
-df.columns = df.iloc[0]
-df = df[1:].reset_index(drop=True)
-df = df.rename(columns={df.columns[0]: 'supply_naics'})
-df = pd.melt(
-    df,
-    id_vars='supply_naics',
-    var_name='use_naics',
-    value_name='value'
-)
-
-# Convert the values to float
-df['value'] = pd.to_numeric(df['value'], errors='coerce')
-
-# Only keep the supply and use codes that start with "BS" (business sector)
-df = df[df['supply_naics'].str.startswith('BS')]
-df = df[df['use_naics'].str.startswith('BS')]
-
-# Drop the supply and use code "BS61000"
-df = df[~df['supply_naics'].isin(['BS61000'])]
-df = df[~df['use_naics'].isin(['BS61000'])]
-
-# Define aggregated codes at the 3-digit NAICS level
+df = load_iot_sheet(Path(os.getcwd()).parent / 'Data' / 'IOTs national symmetric domestic and imports L61 2009.xls', slice(10, None), slice(3, -1))
+
+# Only keep the supply and use codes that start with "BS" (business sector), except "BS61000"
+drop_set_09 = frozenset({'BS61000'})
+df = df[df['supply_naics'].str.startswith('BS', na=False) & df['use_naics'].str.startswith('BS', na=False) & ~df['supply_naics'].isin(drop_set_09) & ~df['use_naics'].isin(drop_set_09)]
+
+# Define aggregated codes at the 3-digit NAICS level and drop the detailed codes
 df['supply_naics_agg'] = df['supply_naics'].str[2:5]
 df['use_naics_agg'] = df['use_naics'].str[2:5]
+df = df[['supply_naics_agg', 'use_naics_agg', 'value']]
 
-# Aggregate the data frame at the 3-digit NAICS level
-df = df.groupby(['supply_naics_agg', 'use_naics_agg'], as_index=False).agg({'value': 'sum'})
-
-# Map the aggregation grouping
-df.loc[df['supply_naics_agg'].isin(naics_agg.keys()), 'supply_naics_agg'] = df.loc[df['supply_naics_agg'].isin(naics_agg.keys()), 'supply_naics_agg'].map(naics_agg)
-df.loc[df['use_naics_agg'].isin(naics_agg.keys()), 'use_naics_agg'] = df.loc[df['use_naics_agg'].isin(naics_agg.keys()), 'use_naics_agg'].map(naics_agg)
+# Map the aggregation grouping, keeping the codes without a mapping
+df['supply_naics_agg'] = df['supply_naics_agg'].map(naics_agg_map).fillna(df['supply_naics_agg'])
+df['use_naics_agg'] = df['use_naics_agg'].map(naics_agg_map).fillna(df['use_naics_agg'])
 
 # Aggregate the data frame at the coarser 3-digit NAICS level
 df = df.groupby(['supply_naics_agg', 'use_naics_agg'], as_index=False).agg({'value': 'sum'})
 
-# Create a DataFrame with all possible combinations of codes
+# List the codes of the I-O table and include the capital and labor costs
 all_naics = list(set(df['supply_naics_agg'].unique()) | set(df['use_naics_agg'].unique())) + ['capital', 'labor']
-df_all = pd.DataFrame([(supply, use) for supply in all_naics for use in all_naics], columns=['supply_naics_agg', 'use_naics_agg'])
-df = pd.merge(df_all, df, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-
-# Include the capital and labor costs
-df_capital = df_cl.loc[df_cl['year'] == 2009, ['capital_cost', 'naics']].rename(columns={'naics': 'use_naics_agg'})
-df_capital['supply_naics_agg'] = 'capital'
-df_capital['capital_cost'] = df_capital['capital_cost'] * 1000
-df = pd.merge(df, df_capital, on=['use_naics_agg', 'supply_naics_agg'], how='left')
-df.loc[(df['supply_naics_agg'] == 'capital') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'value'] = df.loc[(df['supply_naics_agg'] == 'capital') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'capital_cost']
-df = df.drop(columns=['capital_cost'])
-df_labor = df_cl.loc[df_cl['year'] == 2009, ['labor_cost', 'naics']].rename(columns={'naics': 'use_naics_agg'})
-df_labor['supply_naics_agg'] = 'labor'
-df_labor['labor_cost'] = df_labor['labor_cost'] * 1000
-df = pd.merge(df, df_labor, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-df.loc[(df['supply_naics_agg'] == 'labor') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'value'] = df.loc[(df['supply_naics_agg'] == 'labor') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'labor_cost']
-df = df.drop(columns=['labor_cost'])
-
-# Fill in the missing values with 0
-df.loc[df['value'].isna(), 'value'] = 0
-
-# Calculate the cost share of each industry
-df['cost_share'] = df.groupby('use_naics_agg')['value'].transform(lambda x: x / x.sum())
-df.loc[df['cost_share'].isna(), 'cost_share'] = 0
-
-# Sort the data frame by year, use_naics_agg, and supply_naics_agg
-df_09 = df.sort_values(by=['use_naics_agg', 'supply_naics_agg'])
-
-# Create the year column
-df_09['year'] = 2009
+df = pd.concat([df.assign(year=2009), cap_by_year[2009], lab_by_year[2009]], ignore_index=True)
+
+# Calculate the cost share of each industry on the sparse use-by-supply matrices of the I-O flows
+df = sparse_cost_shares(df, all_naics, [2009])
+
+# Store the data frame
+df_09 = df
 
 ########################################################################
 # Prepare the I-O tables from Statistics Canada data for 1997-2008     # 
 ########################################################################
 
-# Create an empty DataFrame
-df_97_08 = pd.DataFrame()
-
-# Iterate over the years 1997 to 2008
-for year in range(1997, 2008 + 1):
+# Define a function to prepare the I-O table of a given year
+def process_year_97_08(year, cap, lab, naics_agg_97_08_map):
     # Load the data
-    df = pd.read_excel(os.path.join(Path(os.getcwd()).parent, 'Data', 'IOTs national symmetric domestic and imports L-Public ' + str(year) + '.xls'), sheet_name="Domestic", header=None)
-
-    # Drop useless rows and columns
-    df = df.iloc[13:107, :].drop(index=14).reset_index(drop=True)
-    df = df.drop(df.columns[[0, 2]], axis=1).iloc[:, :93]
-
-    # Reshape the data
-    df.columns = df.iloc[0]
-    df = df[1:].reset_index(drop=True)
-    df = df.rename(columns={df.columns[0]: 'supply_naics'})
-    df = pd.melt(
-        df,
-        id_vars='supply_naics',
-        var_name='use_naics',
-        value_name='value'
-    )
-
-    # Convert the values to float
-    df['value'] = pd.to_numeric(df['value'], errors='coerce')
+    df = load_iot_sheet(Path(os.getcwd()).parent / 'Data' / ('IOTs national symmetric domestic and imports L-Public ' + str(year) + '.xls'), slice(13, 107), slice(3, 95))
 
     # Drop the supply and use code "611A"
     df = df[~df['supply_naics'].isin(['611A'])]
@@ -629,57 +595,32 @@ for year in range(1997, 2008 + 1):
     # Rename the supply and use codes
     df = df.rename(columns={'supply_naics': 'supply_naics_agg', 'use_naics': 'use_naics_agg'})
 
-    # Map the aggregation grouping
-    df.loc[df['supply_naics_agg'].isin(naics_agg_97_08.keys()), 'supply_naics_agg'] = df.loc[df['supply_naics_agg'].isin(naics_agg_97_08.keys()), 'supply_naics_agg'].map(naics_agg_97_08)
-    df.loc[df['use_naics_agg'].isin(naics_agg_97_08.keys()), 'use_naics_agg'] = df.loc[df['use_naics_agg'].isin(naics_agg_97_08.keys()), 'use_naics_agg'].map(naics_agg_97_08)
+    # Map the aggregation grouping, keeping the codes without a mapping
+    df['supply_naics_agg'] = df['supply_naics_agg'].map(naics_agg_97_08_map).fillna(df['supply_naics_agg'])
+    df['use_naics_agg'] = df['use_naics_agg'].map(naics_agg_97_08_map).fillna(df['use_naics_agg'])
 
     # Aggregate the data frame at the coarser 3-digit NAICS level
     df = df.groupby(['supply_naics_agg', 'use_naics_agg'], as_index=False).agg({'value': 'sum'})
 
-    # Create a DataFrame with all possible combinations of codes
+    # List the codes of the I-O table and include the capital and labor costs
     all_naics = list(set(df['supply_naics_agg'].unique()) | set(df['use_naics_agg'].unique())) + ['capital', 'labor']
-    df_all = pd.DataFrame([(supply, use) for supply in all_naics for use in all_naics], columns=['supply_naics_agg', 'use_naics_agg'])
-    df = pd.merge(df_all, df, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-
-    # Include the capital and labor costs
-    df_capital = df_cl.loc[df_cl['year'] == year, ['capital_cost', 'naics']].rename(columns={'naics': 'use_naics_agg'})
-    df_capital['supply_naics_agg'] = 'capital'
-    df_capital['capital_cost'] = df_capital['capital_cost'] * 1000
-    df = pd.merge(df, df_capital, on=['use_naics_agg', 'supply_naics_agg'], how='left')
-    df.loc[(df['supply_naics_agg'] == 'capital') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'value'] = df.loc[(df['supply_naics_agg'] == 'capital') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'capital_cost']
-    df = df.drop(columns=['capital_cost'])
-    df_labor = df_cl.loc[df_cl['year'] == year, ['labor_cost', 'naics']].rename(columns={'naics': 'use_naics_agg'})
-    df_labor['supply_naics_agg'] = 'labor'
-    df_labor['labor_cost'] = df_labor['labor_cost'] * 1000
-    df = pd.merge(df, df_labor, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-    df.loc[(df['supply_naics_agg'] == 'labor') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'value'] = df.loc[(df['supply_naics_agg'] == 'labor') & ~df['use_naics_agg'].isin(['capital', 'labor']), 'labor_cost']
-    df = df.drop(columns=['labor_cost'])
-
-    # Fill in the missing values with 0
-    df.loc[df['value'].isna(), 'value'] = 0
-
-    # Calculate the cost share of each industry
-    df['cost_share'] = df.groupby('use_naics_agg')['value'].transform(lambda x: x / x.sum())
-    df.loc[df['cost_share'].isna(), 'cost_share'] = 0
+    df = pd.concat([df.assign(year=year), cap, lab], ignore_index=True)
 
-    # Sort the data frame by year, use_naics_agg, and supply_naics_agg
-    df = df.sort_values(by=['use_naics_agg', 'supply_naics_agg'])
+    # Calculate the cost share of each industry on the sparse use-by-supply matrices of the I-O flows
+    df = sparse_cost_shares(df, all_naics, [year])
 
-    # Create the year column
-    df['year'] = year
+    return df
 
-    # Append the data to the DataFrame
-    df_97_08 = pd.concat([df_97_08, df], ignore_index=True)
-
-# Sort the data frame by year, use_naics_agg, and supply_naics_agg
-df_97_08 = df_97_08.sort_values(by=['year', 'use_naics_agg', 'supply_naics_agg'])
+# Prepare the I-O tables of the years 1997 to 2008 in parallel
+parts_97_08 = Parallel(n_jobs=min(12, os.cpu_count()), backend='loky')(delayed(process_year_97_08)(year, cap_by_year[year], lab_by_year[year], naics_agg_97_08_map) for year in range(1997, 2008 + 1))
+df_97_08 = pd.concat(parts_97_08, ignore_index=True)
 
 ########################################################################
 # Prepare the I-O tables from Statistics Canada data for 1961-2008     #
 ########################################################################
 
 # Retrieve the data from Table 36-10-0407-01
-df = sc.table_to_df('36-10-0407-01')
+df = cached_table(sc, '36-10-0407-01')
 
 # Keep the relevant columns
 df = df[['REF_DATE', 'Inputs-outputs', 'North American Industry Classification System (NAICS)', 'Commodity', 'VALUE']].rename(columns={'REF_DATE': 'date', 'Inputs-outputs': 'io', 'North American Industry Classification System (NAICS)': 'naics', 'Commodity': 'commodity', 'VALUE': 'value'})
@@ -694,10 +635,10 @@ df_i = df[df['io'] == 'Inputs'].drop(columns=['io'])
 df_o = df[df['io'] == 'Outputs'].drop(columns=['io'])
 
 # Map the aggregation grouping
-df_i = df_i[df_i['naics'].isin(naics_agg_61_08.keys())]
-df_i['naics'] = df_i['naics'].map(naics_agg_61_08)
-df_o = df_o[df_o['naics'].isin(naics_agg_61_08.keys())]
-df_o['naics'] = df_o['naics'].map(naics_agg_61_08)
+df_i = df_i[df_i['naics'].isin(naics_agg_61_08_map.index)]
+df_i['naics'] = df_i['naics'].map(naics_agg_61_08_map)
+df_o = df_o[df_o['naics'].isin(naics_agg_61_08_map.index)]
+df_o['naics'] = df_o['naics'].map(naics_agg_61_08_map)
 
 # Drop the "Total commodities" rows
 df_i = df_i[df_i['commodity'] != 'Total commodities']
@@ -714,103 +655,105 @@ fc1_output = df_o.loc[df_o['naics'] == 'FC1', 'commodity'].unique()[0]
 df_o = df_o[df_o['naics'] != 'FC1']
 df_i_fc1 = df_i[df_i['naics'] == 'FC1']
 df_i = df_i[df_i['naics'] != 'FC1']
-df_i_fc1['share'] = df_i_fc1.groupby('year', as_index=False)['value'].transform(lambda x: x / x.sum())
-df_i = pd.merge(df_i.loc[df_i['commodity'] != fc1_output, :], df_i.loc[df_i['commodity'] == fc1_output, ['year', 'naics', 'value']].rename(columns={'value': 'value_fc1'}), how='left', on=['year', 'naics'])
-df_i['value_fc1'] = df_i['value_fc1'].fillna(0)
-df_i = pd.merge(df_i, df_i_fc1[['year', 'commodity', 'share']], how='left', on=['year', 'commodity'])
-df_i['share'] = df_i['share'].fillna(0)
-df_i['value'] = df_i['value'] + df_i['value_fc1'] * df_i['share']
-df_i = df_i.drop(columns=['value_fc1', 'share'])
+fc1_share = df_i_fc1.set_index(['year', 'commodity'])['value']
+fc1_share = fc1_share / fc1_share.groupby(level='year').transform('sum')
+fc1_value = df_i.loc[df_i['commodity'] == fc1_output].set_index(['year', 'naics'])['value']
+df_i = df_i[df_i['commodity'] != fc1_output]
+df_i['value'] = df_i['value'] + fc1_value.reindex(pd.MultiIndex.from_frame(df_i[['year', 'naics']])).fillna(0).to_numpy() * fc1_share.reindex(pd.MultiIndex.from_frame(df_i[['year', 'commodity']])).fillna(0).to_numpy()
 
 # Reallocate the intermediate inputs of the third fictive industry to actual industries
 fc3_output = df_o.loc[df_o['naics'] == 'FC3', 'commodity'].unique()[0]
 df_o = df_o[df_o['naics'] != 'FC3']
 df_i_fc3 = df_i[df_i['naics'] == 'FC3']
 df_i = df_i[df_i['naics'] != 'FC3']
-df_i_fc3['share'] = df_i_fc3.groupby('year', as_index=False)['value'].transform(lambda x: x / x.sum())
-df_i = pd.merge(df_i.loc[df_i['commodity'] != fc3_output, :], df_i.loc[df_i['commodity'] == fc3_output, ['year', 'naics', 'value']].rename(columns={'value': 'value_fc3'}), how='left', on=['year', 'naics'])
-df_i['value_fc3'] = df_i['value_fc3'].fillna(0)
-df_i = pd.merge(df_i, df_i_fc3[['year', 'commodity', 'share']], how='left', on=['year', 'commodity'])
-df_i['share'] = df_i['share'].fillna(0)
-df_i['value'] = df_i['value'] + df_i['value_fc3'] * df_i['share']
-df_i = df_i.drop(columns=['value_fc3', 'share'])
-
-# Drop the non-common commodities
-df_o = df_o[~df_o['commodity'].isin(set(df_o['commodity'].unique()) - set(df_i['commodity'].unique()))]
-df_i = df_i[~df_i['commodity'].isin(set(df_i['commodity'].unique()) - set(df_o['commodity'].unique()))]
+fc3_share = df_i_fc3.set_index(['year', 'commodity'])['value']
+fc3_share = fc3_share / fc3_share.groupby(level='year').transform('sum')
+fc3_value = df_i.loc[df_i['commodity'] == fc3_output].set_index(['year', 'naics'])['value']
+df_i = df_i[df_i['commodity'] != fc3_output]
+df_i['value'] = df_i['value'] + fc3_value.reindex(pd.MultiIndex.from_frame(df_i[['year', 'naics']])).fillna(0).to_numpy() * fc3_share.reindex(pd.MultiIndex.from_frame(df_i[['year', 'commodity']])).fillna(0).to_numpy()
 
-# Create an empty DataFrame
-df_61_08_ita = pd.DataFrame()
-df_61_08_cta = pd.DataFrame()
+# Encode the commodities with categories shared by the input and output tables
+commodities = pd.Index(sorted(set(df_i['commodity']) | set(df_o['commodity'])), name='commodity')
+i_commodity = pd.Categorical(df_i['commodity'], categories=commodities).codes
+o_commodity = pd.Categorical(df_o['commodity'], categories=commodities).codes
 
-# Iterate over the years 1961 to 2008
-for y in range(1961, 2008 + 1):
-    # Create the input and output DataFrames for the current year
-    U = df_i.loc[df_i['year'] == y].pivot_table(index='commodity', columns='naics', values='value', aggfunc='sum', fill_value=0).astype(float)
-    V = df_o.loc[df_o['year'] == y].pivot_table(index='commodity', columns='naics', values='value', aggfunc='sum', fill_value=0).astype(float)
-    U, V = U.align(V, join='outer', axis=0, fill_value=0)
-    x_ita = V.sum(axis=0)
-    x_cta = V.sum(axis=1)
-    Xinv_ita = 1 / x_ita.replace(0, float('inf'))
-    Xinv_cta = 1 / x_cta.replace(0, float('inf'))
-    B_ita = V.mul(Xinv_ita, axis=1)
-    B_cta = V.mul(Xinv_cta, axis=0)
-    Z_ita = B_ita.T.dot(U)
-    Z_cta = B_cta.T.dot(U)
-    Z_ita.index.name = 'supply_naics_agg'
-    Z_cta.index.name = 'supply_naics_agg'
-    Z_ita = Z_ita.reset_index().melt(id_vars='supply_naics_agg', var_name='use_naics_agg', value_name='value')
-    Z_cta = Z_cta.reset_index().melt(id_vars='supply_naics_agg', var_name='use_naics_agg', value_name='value')
-
-    # Create a DataFrame with all possible combinations of codes
-    all_naics_ita = list(set(Z_ita['supply_naics_agg'].unique()) | set(Z_ita['use_naics_agg'].unique())) + ['capital', 'labor']
-    all_naics_cta = list(set(Z_cta['supply_naics_agg'].unique()) | set(Z_cta['use_naics_agg'].unique())) + ['capital', 'labor']
-    Z_all_ita = pd.DataFrame([(supply, use) for supply in all_naics_ita for use in all_naics_ita], columns=['supply_naics_agg', 'use_naics_agg'])
-    Z_all_cta = pd.DataFrame([(supply, use) for supply in all_naics_cta for use in all_naics_cta], columns=['supply_naics_agg', 'use_naics_agg'])
-    Z_ita = pd.merge(Z_all_ita, Z_ita, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-    Z_cta = pd.merge(Z_all_cta, Z_cta, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-
-    # Include the capital and labor costs
-    df_capital = df_cl.loc[df_cl['year'] == y, ['capital_cost', 'naics']].rename(columns={'naics': 'use_naics_agg'})
-    df_capital['supply_naics_agg'] = 'capital'
-    df_capital['capital_cost'] = df_capital['capital_cost']
-    Z_ita = pd.merge(Z_ita, df_capital, on=['use_naics_agg', 'supply_naics_agg'], how='left')
-    Z_cta = pd.merge(Z_cta, df_capital, on=['use_naics_agg', 'supply_naics_agg'], how='left')
-    Z_ita.loc[(Z_ita['supply_naics_agg'] == 'capital') & ~Z_ita['use_naics_agg'].isin(['capital', 'labor']), 'value'] = Z_ita.loc[(Z_ita['supply_naics_agg'] == 'capital') & ~Z_ita['use_naics_agg'].isin(['capital', 'labor']), 'capital_cost']
-    Z_cta.loc[(Z_cta['supply_naics_agg'] == 'capital') & ~Z_cta['use_naics_agg'].isin(['capital', 'labor']), 'value'] = Z_cta.loc[(Z_cta['supply_naics_agg'] == 'capital') & ~Z_cta['use_naics_agg'].isin(['capital', 'labor']), 'capital_cost']
-    Z_ita = Z_ita.drop(columns=['capital_cost'])
-    Z_cta = Z_cta.drop(columns=['capital_cost'])
-    df_labor = df_cl.loc[df_cl['year'] == y, ['labor_cost', 'naics']].rename(columns={'naics': 'use_naics_agg'})
-    df_labor['supply_naics_agg'] = 'labor'
-    df_labor['labor_cost'] = df_labor['labor_cost']
-    Z_ita = pd.merge(Z_ita, df_labor, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-    Z_cta = pd.merge(Z_cta, df_labor, on=['supply_naics_agg', 'use_naics_agg'], how='left')
-    Z_ita.loc[(Z_ita['supply_naics_agg'] == 'labor') & ~Z_ita['use_naics_agg'].isin(['capital', 'labor']), 'value'] = Z_ita.loc[(Z_ita['supply_naics_agg'] == 'labor') & ~Z_ita['use_naics_agg'].isin(['capital', 'labor']), 'labor_cost']
-    Z_cta.loc[(Z_cta['supply_naics_agg'] == 'labor') & ~Z_cta['use_naics_agg'].isin(['capital', 'labor']), 'value'] = Z_cta.loc[(Z_cta['supply_naics_agg'] == 'labor') & ~Z_cta['use_naics_agg'].isin(['capital', 'labor']), 'labor_cost']
-    Z_ita = Z_ita.drop(columns=['labor_cost'])
-    Z_cta = Z_cta.drop(columns=['labor_cost'])
-
-    # Fill in the missing values with 0
-    Z_ita.loc[Z_ita['value'].isna(), 'value'] = 0
-    Z_cta.loc[Z_cta['value'].isna(), 'value'] = 0
+# Drop the non-common commodities
+common = np.intersect1d(i_commodity, o_commodity)
+commodities = commodities[common]
+i_keep = np.isin(i_commodity, common)
+o_keep = np.isin(o_commodity, common)
+df_i, i_commodity = df_i[i_keep], np.searchsorted(common, i_commodity[i_keep])
+df_o, o_commodity = df_o[o_keep], np.searchsorted(common, o_commodity[o_keep])
+
+# Encode the industries with categories shared by the input and output tables
+industries = pd.Index(sorted(set(df_i['naics']) | set(df_o['naics'])), name='naics')
+i_naics = pd.Categorical(df_i['naics'], categories=industries).codes
+o_naics = pd.Categorical(df_o['naics'], categories=industries).codes
+i_value = df_i['value'].fillna(0).to_numpy(dtype=float)
+o_value = df_o['value'].fillna(0).to_numpy(dtype=float)
+
+# Accumulate the input and output tables of all years into dense year-by-commodity-by-industry arrays
+years_61_08 = range(1961, 2008 + 1)
+shape_61_08 = (len(years_61_08), len(commodities), len(industries))
+U3, i_present = code_tensor(df_i['year'].to_numpy() - 1961, i_commodity, i_naics, i_value, shape_61_08)
+V3, o_present = code_tensor(df_o['year'].to_numpy() - 1961, o_commodity, o_naics, o_value, shape_61_08)
+
+# Calculate the industry-by-industry flows of all years under the industry and commodity technology assumptions
+x_ita = V3.sum(axis=1)
+x_cta = V3.sum(axis=2)
+Xinv_ita = np.divide(1.0, x_ita, out=np.zeros_like(x_ita), where=x_ita != 0)
+Xinv_cta = np.divide(1.0, x_cta, out=np.zeros_like(x_cta), where=x_cta != 0)
+# (the flows are accumulated and normalized in float64, and only the batched matmuls run in float32)
+U3_32 = U3.astype(np.float32)
+Z3_ita = Xinv_ita[:, :, None] * np.matmul(V3.transpose(0, 2, 1).astype(np.float32), U3_32)
+Z3_cta = np.matmul((V3 * Xinv_cta[:, :, None]).transpose(0, 2, 1).astype(np.float32), U3_32).astype(np.float64)
+
+# Create empty lists to collect the yearly data frames
+ita_chunks, cta_chunks = [], []
+
+# Define a function to create the matrix of flows of the k-th year among the industries present in that year, with the capital and labor costs as the last two rows, and its cost shares
+def flow_matrix(Z3_year, k, cl_y):
+    present = o_present[k] | i_present[k]
+    n = present.sum()
+    Z = np.zeros((n + 2, n + 2))
+    Z[np.ix_(np.flatnonzero(o_present[k][present]), np.flatnonzero(i_present[k][present]))] = Z3_year[np.ix_(o_present[k], i_present[k])]
+    Z[n, :n] = cl_y['capital_cost'].fillna(0).to_numpy()
+    Z[n + 1, :n] = cl_y['labor_cost'].fillna(0).to_numpy()
 
     # Calculate the cost share of each industry
-    Z_ita['cost_share'] = Z_ita.groupby('use_naics_agg')['value'].transform(lambda x: x / x.sum())
-    Z_cta['cost_share'] = Z_cta.groupby('use_naics_agg')['value'].transform(lambda x: x / x.sum())
-    Z_ita.loc[Z_ita['cost_share'].isna(), 'cost_share'] = 0
-    Z_cta.loc[Z_cta['cost_share'].isna(), 'cost_share'] = 0
-
-    # Sort the data frame by year, use_naics_agg, and supply_naics_agg
-    Z_ita = Z_ita.sort_values(by=['use_naics_agg', 'supply_naics_agg'])
-    Z_cta = Z_cta.sort_values(by=['use_naics_agg', 'supply_naics_agg'])
+    total = Z.sum(axis=0)
+    cost_share = np.divide(Z, total, out=np.zeros_like(Z), where=total != 0)
 
-    # Append the data to the DataFrame
-    df_61_08_ita = pd.concat([df_61_08_ita, Z_ita.assign(year=y)], ignore_index=True)
-    df_61_08_cta = pd.concat([df_61_08_cta, Z_cta.assign(year=y)], ignore_index=True)
+    return Z, cost_share
 
-# Sort the data frame by year, use_naics_agg, and supply_naics_agg
-df_61_08_ita = df_61_08_ita.sort_values(by=['year', 'use_naics_agg', 'supply_naics_agg'])
-df_61_08_cta = df_61_08_cta.sort_values(by=['year', 'use_naics_agg', 'supply_naics_agg'])
+# Iterate over the years 1961 to 2008
+for k, y in enumerate(years_61_08):
+    # Locate the industries present in the current year
+    present = o_present[k] | i_present[k]
+    all_naics = industries[present].append(pd.Index(['capital', 'labor']))
+    n = present.sum()
+    cl_y = cl_by_year[y].reindex(industries[present])
+
+    for Z3, chunks in [(Z3_ita, ita_chunks), (Z3_cta, cta_chunks)]:
+        Z, cost_share = flow_matrix(Z3[k], k, cl_y)
+
+        # Append the data in long form, sorted by use_naics_agg and supply_naics_agg, to the list
+        chunks.append(pd.DataFrame({'supply_naics_agg': np.tile(all_naics, n + 2), 'use_naics_agg': np.repeat(all_naics, n + 2), 'value': Z.T.ravel(), 'cost_share': cost_share.T.ravel(), 'year': y}))
+
+# Check on a sample year that running the batched matmuls in float32 leaves the Leontief-adjusted lambda's unchanged
+k = len(years_61_08) // 2
+cl_y = cl_by_year[years_61_08[k]].reindex(industries[o_present[k] | i_present[k]])
+b = cl_y['va'].fillna(0).to_numpy()
+b = np.append(b / b.sum(), [0, 0])
+lambda_check = []
+for Z3_year in [Z3_ita[k], Xinv_ita[k][:, None] * (V3[k].T @ U3[k])]:
+    _, cost_share = flow_matrix(Z3_year, k, cl_y)
+    lambda_check.append(solve(np.eye(len(b)) - cost_share, b, check_finite=False))
+assert np.allclose(lambda_check[0], lambda_check[1], rtol=1e-5), 'float32 I-O flows moved the lambda\'s of ' + str(years_61_08[k])
+
+# Concatenate the yearly data frames
+df_61_08_ita = pd.concat(ita_chunks, ignore_index=True)
+df_61_08_cta = pd.concat(cta_chunks, ignore_index=True)
 
 # Only keep the years 1961 to 1996 from the CTA approach
 df_61_96 = df_61_08_cta[df_61_08_cta['year'] < 1997]
@@ -819,47 +762,60 @@ df_61_96 = df_61_08_cta[df_61_08_cta['year'] < 1997]
 # Append the I-O tables across all years and calculate the lambda's    # 
 ########################################################################
 
-# Concatenate the data frames
-df = pd.concat([df_13_19, df_10_12, df_09, df_97_08, df_61_96], ignore_index=True)
+# Stack the values and cost shares of all years into (year, use, supply, variable) arrays over the union of the codes
+blocks = [df_61_96, df_97_08, df_09, df_10_12, df_13_19]
+years = np.concatenate([np.sort(block['year'].unique()) for block in blocks])
+codes = sorted(set().union(*[block['supply_naics_agg'] for block in blocks]))
+io_stack = np.concatenate([block.set_index(['year', 'use_naics_agg', 'supply_naics_agg'])[['value', 'cost_share']].reindex(full_grid(codes, np.sort(block['year'].unique())), fill_value=0).to_numpy().reshape(-1, len(codes), len(codes), 2) for block in blocks])
+
+# Create the long-form data frame of the stacked arrays, which is sorted by year, use_naics_agg, and supply_naics_agg
+df = pd.DataFrame({'value': io_stack[..., 0].ravel(), 'cost_share': io_stack[..., 1].ravel()}, index=full_grid(codes, years)).reset_index()
 df = pd.merge(df, df_cl[['year', 'naics', 'sales']].rename(columns={'naics': 'use_naics_agg'}), how='left', on=['year', 'use_naics_agg'])
-df = df.sort_values(by=['year', 'use_naics_agg', 'supply_naics_agg'])
 
-# Create the cost-based IO matrices for each year and calculate the lambda's
-df_lambda = pd.DataFrame([(year, naics) for naics in df_cl['naics'].unique() for year in df_cl['year'].unique()], columns=['year', 'naics']).sort_values(by=['year', 'naics'])
-df_lambda['lambda'] = np.nan
-df_lambda['lambda_k'] = np.nan
-df_lambda['lambda_l'] = np.nan
-df_lambda['wedge'] = np.nan
-for year in df_lambda['year'].unique():
-    df_year = df[df['year'] == year]
+# Define a function to create the cost-based IO matrices of a given year and calculate its lambda's
+def process_year_lambda(year, df_year, va):
     if year < 1997:
         df_year['revenue_share'] = df_year['value'] / df_year['sales']
     else:
         df_year['revenue_share'] = df_year['value'] / (1000 * df_year['sales'])
     df_year.loc[df_year['revenue_share'].isna(), 'revenue_share'] = 0
-    df_year_cost = df_year.pivot(index='use_naics_agg', columns='supply_naics_agg', values='cost_share')
-    df_year_revenue = df_year.pivot(index='use_naics_agg', columns='supply_naics_agg', values='revenue_share')
+    df_year_pivot = df_year.pivot(index='use_naics_agg', columns='supply_naics_agg', values=['cost_share', 'revenue_share'])
+    df_year_cost = df_year_pivot['cost_share']
+    df_year_revenue = df_year_pivot['revenue_share']
     naics_list = df_year_cost.index.tolist()
-    Omega_tilde = sparse.csr_matrix(df_year_cost.values)
-    Omega = sparse.csr_matrix(df_year_revenue.values)
-    b = df_cl.loc[df_cl['year'] == year, ['naics', 'va']].sort_values(by=['naics'])['va'].values
+    Omega_tilde = df_year_cost.to_numpy(dtype=np.float64)
+    Omega = df_year_revenue.to_numpy(dtype=np.float64)
+    b = va.sort_index().to_numpy()
     b = b / b.sum()
     b = np.append(b, [0, 0])
-    lambda_tilde = np.matmul(b.transpose(), np.linalg.inv(np.eye(Omega_tilde.shape[0]) - Omega_tilde))
-    numerator = np.sum(np.matmul(Omega_tilde[:-2, :-2].todense(), Omega[:-2, :-2].todense()), axis=1)
-    denominator = np.sum(np.matmul(Omega[:-2, :-2].todense(), Omega[:-2, :-2].todense()), axis=1)
-    wedge = numerator / denominator
-    d_lambda = dict([(naics_list[i], lambda_tilde[0, i]) for i in range(len(naics_list) - 2)])
-    d_wedge = dict([(naics_list[i], wedge.flatten()[0, i]) for i in range(len(naics_list) - 2)])
-    df_lambda.loc[df_lambda['year'] == year, 'lambda'] = df_lambda[df_lambda['year'] == year]['naics'].map(d_lambda)
-    df_lambda.loc[df_lambda['year'] == year, 'lambda_k'] = lambda_tilde[0, -2]
-    df_lambda.loc[df_lambda['year'] == year, 'lambda_l'] = lambda_tilde[0, -1]
-    df_lambda.loc[df_lambda['year'] == year, 'wedge'] = df_lambda[df_lambda['year'] == year]['naics'].map(d_wedge)
-
-# Take the average of successive years
-df_lambda['lambda'] = df_lambda.groupby('naics')['lambda'].transform(lambda x: x.rolling(2).mean())
-df_lambda['lambda_k'] = df_lambda.groupby('naics')['lambda_k'].transform(lambda x: x.rolling(2).mean())
-df_lambda['lambda_l'] = df_lambda.groupby('naics')['lambda_l'].transform(lambda x: x.rolling(2).mean())
+    lambda_tilde, wedge = solve_year(Omega_tilde, Omega, b)
+    d_lambda = dict([(naics_list[i], lambda_tilde[i]) for i in range(len(naics_list) - 2)])
+    d_wedge = dict([(naics_list[i], wedge[i]) for i in range(len(naics_list) - 2)])
+    return year, d_lambda, lambda_tilde[-2], lambda_tilde[-1], d_wedge
+
+# Create the cost-based IO matrices for each year and calculate the lambda's
+df_lambda = pd.DataFrame([(year, naics) for naics in df_cl['naics'].unique() for year in df_cl['year'].unique()], columns=['year', 'naics']).sort_values(by=['year', 'naics'])
+df_lambda['lambda'] = np.nan
+df_lambda['lambda_k'] = np.nan
+df_lambda['lambda_l'] = np.nan
+df_lambda['wedge'] = np.nan
+df_rows = df.groupby('year', sort=False).indices
+years_lambda = df_lambda['year'].unique()
+parts_lambda = Parallel(n_jobs=min(len(years_lambda), os.cpu_count()), backend='loky')(delayed(process_year_lambda)(year, df.take(df_rows[year]), cl_by_year[year]['va']) for year in years_lambda)
+lambda_rows = df_lambda.groupby('year', sort=False).indices
+for year, d_lambda, lambda_k, lambda_l, d_wedge in parts_lambda:
+    rows = df_lambda.index[lambda_rows[year]]
+    df_lambda.loc[rows, 'lambda'] = df_lambda.loc[rows, 'naics'].map(d_lambda)
+    df_lambda.loc[rows, 'lambda_k'] = lambda_k
+    df_lambda.loc[rows, 'lambda_l'] = lambda_l
+    df_lambda.loc[rows, 'wedge'] = df_lambda.loc[rows, 'naics'].map(d_wedge)
+
+# Take the average of successive years within each industry
+df_lambda = df_lambda.sort_values(by=['naics', 'year'])
+boundary = df_lambda['naics'].ne(df_lambda['naics'].shift(1))
+for column in ['lambda', 'lambda_k', 'lambda_l']:
+    df_lambda[column] = (0.5 * (df_lambda[column] + df_lambda[column].shift(1))).mask(boundary)
+df_lambda = df_lambda.sort_values(by=['year', 'naics'])
 
 # Save the data frame to a CSV file
 df_lambda.to_csv(os.path.join(Path(os.getcwd()).parent, 'Data', 'lambda.csv'), index=False)
\ No newline at end of file
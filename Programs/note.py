@@ -56,6 +56,7 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib import rc
 from stats_can import StatsCan
+from statscan_cache import cached_table
 
 ########################################################################
 # Helper functions                                                      #
@@ -109,20 +110,60 @@ def annualize(series_or_df, col, start, end):
     Sums the column for years (start, end] and divides by the number
     of years. The start year itself is excluded because growth rates
     are defined as t vs t-1, so the first year of growth in a subperiod
-    starting at t0 is t0+1.
+    starting at t0 is t0+1. Rows must be sorted by year, so the
+    subperiod is a contiguous slice.
     """
-    mask = (series_or_df['year'] > start) & (series_or_df['year'] <= end)
-    return 100 * series_or_df.loc[mask, col].sum() / (end - start)
+    lo, hi = np.searchsorted(series_or_df['year'].to_numpy(), [start, end], side='right')
+    return 100 * series_or_df[col].iloc[lo:hi].sum() / (end - start)
 
 
-def annualize_decomp(decomp_df, col, start, end):
-    """Annualize a column from a decomposition DataFrame.
+def annualize_columns(df, cols, periods):
+    """Annualize several columns over several subperiods in one pass.
+
+    Same convention as annualize(), but the columns are pulled into a
+    single NumPy matrix once. Returns one list of rates per column,
+    ordered like periods.
+    """
+    # Slice bounds of the rows with start < year <= end, for every period
+    bounds = np.searchsorted(df['year'].to_numpy(), np.asarray(periods), side='right')
+    values = df[cols].to_numpy()
+    rates = np.array([100 * np.nansum(values[lo:hi], axis=0) / (end - start)
+                      for (lo, hi), (start, end) in zip(bounds, periods)])
+    return rates.T.tolist()
+
+
+def annualize_decomps(decomps, cols, periods):
+    """Annualize columns from a list of decomposition DataFrames.
 
     The decomposition DataFrames have a zero-row at the start year
     (since cumulative growth starts at zero). This row does not affect
     the sum, so we sum all rows and divide by the number of years.
+    decomps and periods are matched pairwise; returns one list of rates
+    per column.
     """
-    return 100 * decomp_df[col].sum() / (end - start)
+    rates = np.array([100 * np.nansum(d[cols].to_numpy(), axis=0) / (end - start)
+                      for d, (start, end) in zip(decomps, periods)])
+    return rates.T.tolist()
+
+
+def tornqvist_mean(values, first_year):
+    """Average each value with the previous year's value of the same industry.
+
+    Assumes the panel is sorted by (industry, year). Rows flagged in
+    first_year have no previous year and are set to NaN, as with a
+    per-industry rolling(2).mean(). Accepts one column or a 2D block of
+    columns.
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.empty_like(values)
+    result[1:] = 0.5 * (values[1:] + values[:-1])
+    result[first_year] = np.nan
+    return result
+
+
+def sum_by_year(year_idx, values, n_years):
+    """Sum values into dense year bins, skipping NaNs like a groupby sum."""
+    return np.bincount(year_idx, weights=np.where(np.isnan(values), 0.0, values), minlength=n_years)
 
 
 def compute_tfp_decomposition(df_ind, start, end, base_col):
@@ -144,25 +185,29 @@ def compute_tfp_decomposition(df_ind, start, end, base_col):
         'baumol' = sum_i (S_bar_i - S_{i,t0}) * d ln A_i  (weight changes)
         'total'  = within + baumol = Hulten aggregate TFP (= d ln A)
     """
-    result = pd.DataFrame({'year': range(start, end + 1)})
-
-    d = df_ind.copy()
-    d['within_term'] = d[base_col] * d['tfp_growth']
-    d['baumol_term'] = (d['s_bar'] - d[base_col]) * d['tfp_growth']
-
-    agg_terms = d.groupby('year').agg(
-        within=('within_term', 'sum'),
-        baumol=('baumol_term', 'sum')
-    ).reset_index()
-
-    result = pd.merge(result, agg_terms, on='year', how='left')
-    # Set start year to zero: this is the baseline for cumulative sums.
-    # Growth in year t is measured from t-1 to t, so the first actual
-    # growth observation for a subperiod starting at t0 is at t0+1.
-    result.loc[result['year'] == start, ['within', 'baumol']] = 0.0
-    result['total'] = result['within'] + result['baumol']
-
-    return result
+    # Only the growth years of the subperiod enter the sums.
+    year = df_ind['year'].to_numpy()
+    active = (year > start) & (year <= end)
+    base = df_ind[base_col].to_numpy()[active]
+    tfp_growth = df_ind['tfp_growth'].to_numpy()[active]
+    within_term = base * tfp_growth
+    baumol_term = (df_ind['s_bar'].to_numpy()[active] - base) * tfp_growth
+
+    # Sum the terms by year, skipping missing terms as a groupby sum would.
+    # The start year gets no terms and stays at zero: this is the baseline
+    # for cumulative sums. Growth in year t is measured from t-1 to t, so
+    # the first actual growth observation for a subperiod starting at t0
+    # is at t0+1.
+    idx = year[active] - start
+    n_years = end - start + 1
+    within = sum_by_year(idx, within_term, n_years)
+    baumol = sum_by_year(idx, baumol_term, n_years)
+    return pd.DataFrame({
+        'year': np.arange(start, end + 1),
+        'within': within,
+        'baumol': baumol,
+        'total': within + baumol,
+    })
 
 
 def amplify_decomp(decomp, yearly_df, start):
@@ -172,8 +217,9 @@ def amplify_decomp(decomp, yearly_df, start):
     applying the amplification factor 1/(1-alpha_bar).
     """
     merged = pd.merge(decomp, yearly_df[['year', 'alpha_bar']], on='year', how='left')
-    merged['within_lp'] = merged['within'] / (1 - merged['alpha_bar'])
-    merged['baumol_lp'] = merged['baumol'] / (1 - merged['alpha_bar'])
+    labor_share = 1 - merged['alpha_bar']
+    merged['within_lp'] = merged['within'] / labor_share
+    merged['baumol_lp'] = merged['baumol'] / labor_share
     # Start year: within=baumol=0, alpha_bar may be NaN -> set to 0
     merged.loc[merged['year'] == start, ['within_lp', 'baumol_lp']] = 0.0
     return merged
@@ -203,16 +249,17 @@ def industry_lp_contrib(df_ind, yearly_df, start, end, base_col,
     active = pd.merge(active, yearly_df[['year', 'alpha_bar', 'dlnY', 'ky_contrib']],
                       on='year', how='left')
 
+    labor_share = 1 - active['alpha_bar']
     active['within_lp_term'] = (
-        active[base_col] * active['tfp_growth'] / (1 - active['alpha_bar'])
+        active[base_col] * active['tfp_growth'] / labor_share
     )
     active['baumol_lp_term'] = (
-        (active['s_bar'] - active[base_col]) * active['tfp_growth'] / (1 - active['alpha_bar'])
+        (active['s_bar'] - active[base_col]) * active['tfp_growth'] / labor_share
     )
 
     if capital_method == 'capital_cost_share':
         active['capital_lp_term'] = (
-            active['alpha_bar'] / (1 - active['alpha_bar'])
+            active['alpha_bar'] / labor_share
             * active['omega_k_bar']
             * (active['capital_growth'] - active['dlnY'])
         )
@@ -221,7 +268,7 @@ def industry_lp_contrib(df_ind, yearly_df, start, end, base_col,
             raise ValueError('capital_base_col is required for base_period_capital_share')
         active['capital_weight'] = (
             active[capital_base_col]
-            / active.groupby('year')[capital_base_col].transform('sum')
+            / active.groupby('year', sort=False)[capital_base_col].transform('sum')
         )
         active['capital_lp_term'] = active['capital_weight'] * active['ky_contrib']
     else:
@@ -329,9 +376,8 @@ def aggregate_to_nace(df):
 
     # Base-period VA shares for subperiod decompositions
     for base_year, label in [(1962, 's_1961'), (1980, 's_1980'), (2000, 's_2000')]:
-        base = result.loc[result['year'] == base_year,
-                          ['nace', 's_bar']].rename(columns={'s_bar': label})
-        result = pd.merge(result, base, on='nace', how='left')
+        base = result.loc[result['year'] == base_year].set_index('nace')['s_bar']
+        result[label] = result['nace'].map(base)
 
     # Rename nace→naics for downstream compatibility
     result = result.rename(columns={'nace': 'naics'})
@@ -415,6 +461,10 @@ INDUSTRY_TO_NAICS = {
     'Wood product manufacturing [321]': '321'
 }
 
+# The NAICS codes in sorted order, used as the categories of the naics column
+# so that sorting by naics is unchanged.
+NAICS_CATEGORIES = sorted(INDUSTRY_TO_NAICS.values())
+
 # NAICS → NACE concordance for aggregation to 15 sectors (used for Table 2).
 # O (Public admin) and P (Education) are absent from Canadian business-sector data.
 NAICS_TO_NACE = {
@@ -648,20 +698,25 @@ def clean_statscan_sector_label(label):
 ########################################################################
 
 print('Fetching data from Statistics Canada Table 36-10-0217-01...')
-df = sc.table_to_df('36-10-0217-01')
-
-# Filter to the 39 leaf-level industries
-df = df[~df['North American Industry Classification System (NAICS)'].isin(DROP_LIST)]
-
-# Keep only the 6 relevant variables
-df = df[df['Multifactor productivity and related variables'].isin(RELEVANT_VARS)]
+df = cached_table(sc, '36-10-0217-01')
+
+# Filter to the 39 leaf-level industries, the 6 relevant variables and
+# the years before 2020, so that the reshape only sees the rows it keeps
+df = df.loc[
+    ~df['North American Industry Classification System (NAICS)'].isin(DROP_LIST)
+    & df['Multifactor productivity and related variables'].isin(RELEVANT_VARS)
+    & (df['REF_DATE'].dt.year < 2020),
+    ['North American Industry Classification System (NAICS)', 'REF_DATE',
+     'Multifactor productivity and related variables', 'VALUE']
+]
 
-# Reshape from long to wide: one row per (industry, year)
-df = df.pivot_table(
-    index=['North American Industry Classification System (NAICS)', 'REF_DATE'],
-    columns='Multifactor productivity and related variables',
-    values='VALUE'
-).reset_index().rename_axis(None, axis=1)
+# Reshape from long to wide: one row per (industry, year). Each
+# (industry, date, variable) cell is unique, so a plain unstack replaces
+# the aggregating pivot_table.
+df = df.set_index(
+    ['North American Industry Classification System (NAICS)', 'REF_DATE',
+     'Multifactor productivity and related variables']
+)['VALUE'].unstack('Multifactor productivity and related variables').reset_index().rename_axis(None, axis=1)
 
 df = df.rename(columns={
     'North American Industry Classification System (NAICS)': 'industry',
@@ -674,10 +729,9 @@ df = df.rename(columns={
     'Capital cost': 'capital_cost'
 })
 
-df['year'] = df['date'].dt.year
+df['year'] = df['date'].dt.year.astype(np.int16)
 df = df.drop(columns=['date'])
-df = df[df['year'] < 2020]
-df['naics'] = df['industry'].map(INDUSTRY_TO_NAICS)
+df['naics'] = df['industry'].map(INDUSTRY_TO_NAICS).astype(pd.CategoricalDtype(NAICS_CATEGORIES))
 df = df.sort_values(['naics', 'year']).reset_index(drop=True)
 
 # --- Data validation ---
@@ -699,53 +753,72 @@ print(f'Panel: {n_industries} industries x {n_years} years = {len(df)} observati
 # --- Growth rates (log-differences within each industry) ---
 # d ln X_{it} = ln(X_{it}) - ln(X_{i,t-1})
 # These are NaN for 1961 (no previous year) and defined for 1962-2019.
-for var, col in [('tfp', 'tfp_growth'), ('capital', 'capital_growth'), ('labor', 'labor_growth')]:
-    df[col] = df.groupby('naics')[var].transform(lambda x: np.log(x).diff())
+# The panel is sorted by (naics, year), so each industry's first year is
+# the row where the NAICS code changes. The year, growth and Tornqvist
+# weight arrays are kept as NumPy blocks and reused by the later stages
+# instead of being pulled back out of df.
+naics_codes = df['naics'].cat.codes.to_numpy()
+panel_year = df['year'].to_numpy()
+first_year = np.r_[True, naics_codes[1:] != naics_codes[:-1]]
+log_x = np.log(df[['tfp', 'capital', 'labor']].to_numpy())
+growth = np.empty_like(log_x)
+growth[1:] = log_x[1:] - log_x[:-1]
+growth[first_year] = np.nan
+df[['tfp_growth', 'capital_growth', 'labor_growth']] = growth
+
+# --- Aggregate VA and factor costs (year bins, broadcast back to rows) ---
+panel_year_idx = panel_year - panel_year.min()
+n_panel_years = panel_year_idx.max() + 1
+df[['va_agg', 'capital_cost_agg', 'labor_cost_agg']] = np.column_stack([
+    sum_by_year(panel_year_idx, df[col].to_numpy(), n_panel_years)[panel_year_idx]
+    for col in ['va', 'capital_cost', 'labor_cost']
+])
 
 # --- Nominal VA shares ---
 # s_{it} = VA_{it} / sum_j VA_{jt}  (current-period share)
 # s_bar_{it} = (s_{it} + s_{i,t-1}) / 2  (Tornqvist average)
-df['va_agg'] = df.groupby('year')['va'].transform('sum')
 df['s'] = df['va'] / df['va_agg']
-df['s_bar'] = df.groupby('naics')['s'].transform(lambda x: x.rolling(2).mean())
 
 # --- Capital cost shares (for Divisia capital aggregation) ---
 # omega^K_{it} = capital_cost_{it} / sum_j capital_cost_{jt}
-df['capital_cost_agg'] = df.groupby('year')['capital_cost'].transform('sum')
 df['omega_k'] = df['capital_cost'] / df['capital_cost_agg']
-df['omega_k_bar'] = df.groupby('naics')['omega_k'].transform(lambda x: x.rolling(2).mean())
 
 # --- Industry capital shares (for industry-level K/Y diagnostics) ---
 # alpha_{it} = capital_cost_{it} / VA_{it}
 # alpha_bar_{it} = (alpha_{it} + alpha_{i,t-1}) / 2
 df['alpha_industry'] = df['capital_cost'] / df['va']
-df['alpha_industry_bar'] = df.groupby('naics')['alpha_industry'].transform(
-    lambda x: x.rolling(2).mean())
 
 # --- Labor cost shares (for Divisia labor aggregation) ---
 # omega^L_{it} = labor_cost_{it} / sum_j labor_cost_{jt}
-df['labor_cost_agg'] = df.groupby('year')['labor_cost'].transform('sum')
 df['omega_l'] = df['labor_cost'] / df['labor_cost_agg']
-df['omega_l_bar'] = df.groupby('naics')['omega_l'].transform(lambda x: x.rolling(2).mean())
+
+# --- Tornqvist averages of the four shares (one pass over a 2D array) ---
+share_bars = tornqvist_mean(df[['s', 'omega_k', 'alpha_industry', 'omega_l']], first_year)
+df[['s_bar', 'omega_k_bar', 'alpha_industry_bar', 'omega_l_bar']] = share_bars
 
 # --- Base-period VA shares for subperiod decompositions ---
 # For 1961: use the 1962 Tornqvist average (first non-NaN value).
 # For 1980, 2000: use the Tornqvist average at those years.
+# Each industry's base-year value is placed in its NAICS code slot and
+# broadcast back to the panel by indexing with the codes.
+n_naics = len(df['naics'].cat.categories)
 for base_year, label in [(1962, 's_1961'), (1980, 's_1980'), (2000, 's_2000')]:
-    base_shares = df.loc[df['year'] == base_year, ['naics', 's_bar']].rename(columns={'s_bar': label})
-    df = pd.merge(df, base_shares, on='naics', how='left')
+    at_base = panel_year == base_year
+    base_shares = np.full(n_naics, np.nan)
+    base_shares[naics_codes[at_base]] = share_bars[at_base, 0]
+    df[label] = base_shares[naics_codes]
 
 # --- Base-period capital-cost shares for capital-allocation diagnostics ---
 # We use the same reference years as for the VA shares above.
 for base_year, label in [(1962, 'omega_k_1961'), (1980, 'omega_k_1980'), (2000, 'omega_k_2000')]:
-    base_capital = df.loc[df['year'] == base_year, ['naics', 'omega_k_bar']].rename(
-        columns={'omega_k_bar': label}
-    )
-    df = pd.merge(df, base_capital, on='naics', how='left')
+    at_base = panel_year == base_year
+    base_capital = np.full(n_naics, np.nan)
+    base_capital[naics_codes[at_base]] = share_bars[at_base, 1]
+    df[label] = base_capital[naics_codes]
 
 # --- Validate Tornqvist weights ---
 # Shares should sum to ~1 across industries for each year (1962+).
-weight_sums = df[df['year'] >= 1962].groupby('year').agg(
+weight_sums = df[df['year'] >= 1962].groupby('year', sort=False).agg(
     s_bar_sum=('s_bar', 'sum'),
     omega_k_sum=('omega_k_bar', 'sum'),
     omega_l_sum=('omega_l_bar', 'sum')
@@ -759,14 +832,14 @@ for col, label in [('s_bar_sum', 'VA shares'), ('omega_k_sum', 'Capital weights'
 # --- Cross-check: cumulative growth = log ratio of index levels ---
 # For each industry, sum of d ln A_i from 1962-2019 should equal
 # ln(TFP_{i,2019} / TFP_{i,1961}).
-industry_check = df.groupby('naics').apply(
-    lambda g: pd.Series({
-        'cum_growth': g['tfp_growth'].sum(),
-        'log_ratio': np.log(g['tfp'].iloc[-1] / g['tfp'].iloc[0])
-    }),
-    include_groups=False
-)
-max_disc = (industry_check['cum_growth'] - industry_check['log_ratio']).abs().max()
+# The first-year mask from the growth rates also delimits each industry's
+# block of rows, so the check needs no per-group apply.
+first_rows = np.flatnonzero(first_year)
+last_rows = np.r_[first_rows[1:] - 1, len(df) - 1]
+tfp_level = df['tfp'].to_numpy()
+cum_growth = np.add.reduceat(np.where(first_year, 0.0, growth[:, 0]), first_rows)
+log_ratio = np.log(tfp_level[last_rows] / tfp_level[first_rows])
+max_disc = np.abs(cum_growth - log_ratio).max()
 print(f'Industry TFP growth consistency — max discrepancy: {max_disc:.2e}')
 assert max_disc < 1e-10, 'Industry-level growth rates inconsistent with index levels'
 
@@ -777,7 +850,7 @@ assert max_disc < 1e-10, 'Industry-level growth rates inconsistent with index le
 # --- Aggregate capital share ---
 # alpha_t = sum_i capital_cost_{it} / sum_i VA_{it}
 # alpha_bar_t = (alpha_t + alpha_{t-1}) / 2  (Tornqvist average)
-agg = df.groupby('year').agg(
+agg = df.groupby('year', sort=False).agg(
     capital_cost_total=('capital_cost', 'sum'),
     va_total=('va', 'sum')
 ).reset_index()
@@ -791,61 +864,61 @@ assert 0.25 < agg['alpha'].min() and agg['alpha'].max() < 0.55, (
 
 # --- Aggregate growth rates via Tornqvist indices ---
 # Compute the weighted contributions at the industry level, then sum.
-df['dlnA_term'] = df['s_bar'] * df['tfp_growth']        # S_bar_i * d ln A_i
-df['dlnK_term'] = df['omega_k_bar'] * df['capital_growth']  # omega^K_i * d ln K_i
-df['dlnL_term'] = df['omega_l_bar'] * df['labor_growth']    # omega^L_i * d ln L_i
+# Columns of terms: S_bar_i * d ln A_i, omega^K_i * d ln K_i, omega^L_i * d ln L_i
+terms = share_bars[:, [0, 1, 3]] * growth  # s_bar, omega_k_bar, omega_l_bar
 
 # Aggregate by year (dropping 1961 where all terms are NaN)
-yearly = df.dropna(subset=['dlnA_term']).groupby('year').agg(
-    dlnA=('dlnA_term', 'sum'),  # Hulten aggregate TFP growth
-    dlnK=('dlnK_term', 'sum'),  # Divisia aggregate capital growth
-    dlnL=('dlnL_term', 'sum')   # Divisia aggregate labor growth
-).reset_index()
-
-yearly = pd.merge(yearly, agg[['year', 'alpha_bar']], on='year')
+has_growth = ~np.isnan(terms[:, 0])
+growth_years = panel_year[has_growth]
+first_growth_year = growth_years.min()
+year_idx = growth_years - first_growth_year
+n_growth_years = year_idx.max() + 1
+growth_year_range = np.arange(first_growth_year, first_growth_year + n_growth_years)
+dlnA, dlnK, dlnL = (  # Hulten aggregate TFP growth; Divisia aggregate capital and labor growth
+    sum_by_year(year_idx, term[has_growth], n_growth_years) for term in terms.T
+)
+alpha_bar = agg.set_index('year')['alpha_bar'].reindex(growth_year_range).to_numpy()
 
 # --- Production identity ---
 # d ln Y = d ln A + alpha_bar * d ln K + (1 - alpha_bar) * d ln L
 # This constructs aggregate output growth from the CRS production function.
-yearly['dlnY'] = (yearly['dlnA']
-                  + yearly['alpha_bar'] * yearly['dlnK']
-                  + (1 - yearly['alpha_bar']) * yearly['dlnL'])
+labor_share = 1 - alpha_bar
+dlnY = dlnA + alpha_bar * dlnK + labor_share * dlnL
 
 # --- Labor productivity and capital-output ratio growth ---
-yearly['dlnYL'] = yearly['dlnY'] - yearly['dlnL']   # d ln(Y/L)
-yearly['dlnKY'] = yearly['dlnK'] - yearly['dlnY']   # d ln(K/Y)
-yearly['dlnKL'] = yearly['dlnK'] - yearly['dlnL']   # d ln(K/L)
+dlnYL = dlnY - dlnL   # d ln(Y/L)
+dlnKY = dlnK - dlnY   # d ln(K/Y)
+dlnKL = dlnK - dlnL   # d ln(K/L)
 
 # --- Decomposition ---
 # d ln(Y/L) = [1/(1-alpha_bar)] * d ln A + [alpha_bar/(1-alpha_bar)] * d ln(K/Y)
-yearly['tfp_contrib'] = yearly['dlnA'] / (1 - yearly['alpha_bar'])
-yearly['ky_contrib'] = yearly['alpha_bar'] / (1 - yearly['alpha_bar']) * yearly['dlnKY']
+tfp_contrib = dlnA / labor_share
+ky_contrib = alpha_bar / labor_share * dlnKY
 
 # Alternative K/L decomposition:
 # d ln(Y/L) = d ln A + alpha_bar * d ln(K/L)
 # This is exact but, unlike the K/Y version, it attributes part of the
 # capital deepening induced by TFP to the capital term itself.
-yearly['tfp_kl'] = yearly['dlnA']
-yearly['kl_contrib'] = yearly['alpha_bar'] * yearly['dlnKL']
+kl_contrib = alpha_bar * dlnKL
 
 # --- Identity check (exact by construction) ---
-residual_1 = (yearly['tfp_contrib'] + yearly['ky_contrib'] - yearly['dlnYL']).abs().max()
+residual_1 = np.nanmax(np.abs(tfp_contrib + ky_contrib - dlnYL))
 print(f'\nStep 1 identity — max residual: {residual_1:.2e}')
 assert residual_1 < 1e-10, f'Step 1 identity fails: residual = {residual_1}'
-residual_1_kl = (yearly['tfp_kl'] + yearly['kl_contrib'] - yearly['dlnYL']).abs().max()
+residual_1_kl = np.nanmax(np.abs(dlnA + kl_contrib - dlnYL))
 print(f'Step 1 identity (K/L version) — max residual: {residual_1_kl:.2e}')
 assert residual_1_kl < 1e-10, f'Step 1 K/L identity fails: residual = {residual_1_kl}'
 
-# Prepend a 1961 baseline row (all zeros) for cumulative plots.
-# Growth rates are undefined for 1961; the cumsum starts at 0.
-row_1961 = pd.DataFrame({
-    'year': [1961], 'dlnA': [0.0], 'dlnK': [0.0], 'dlnL': [0.0],
-    'alpha_bar': [np.nan], 'dlnY': [0.0], 'dlnYL': [0.0],
-    'dlnKY': [0.0], 'dlnKL': [0.0],
-    'tfp_contrib': [0.0], 'ky_contrib': [0.0],
-    'tfp_kl': [0.0], 'kl_contrib': [0.0]
+# Build the yearly table once, with a 1961 baseline row (all zeros) for
+# cumulative plots. Growth rates are undefined for 1961; the cumsum starts at 0.
+yearly = pd.DataFrame({
+    'year': np.r_[first_growth_year - 1, growth_year_range],
+    'dlnA': np.r_[0.0, dlnA], 'dlnK': np.r_[0.0, dlnK], 'dlnL': np.r_[0.0, dlnL],
+    'alpha_bar': np.r_[np.nan, alpha_bar], 'dlnY': np.r_[0.0, dlnY], 'dlnYL': np.r_[0.0, dlnYL],
+    'dlnKY': np.r_[0.0, dlnKY], 'dlnKL': np.r_[0.0, dlnKL],
+    'tfp_contrib': np.r_[0.0, tfp_contrib], 'ky_contrib': np.r_[0.0, ky_contrib],
+    'tfp_kl': np.r_[0.0, dlnA], 'kl_contrib': np.r_[0.0, kl_contrib]
 })
-yearly = pd.concat([row_1961, yearly], ignore_index=True)
 
 ########################################################################
 # 4. Step 2: Aggregate TFP decomposition (within vs Baumol)            #
@@ -858,12 +931,14 @@ decomp_00_19 = compute_tfp_decomposition(df, 2000, 2019, 's_2000')
 
 # --- Identity check: within + baumol = Hulten aggregate TFP ---
 # For years after the start year, decomp['total'] should equal yearly['dlnA'].
+# Both checks align on a year index rather than merging each decomposition.
+yearly_by_year = yearly.set_index('year')
 for name, decomp, start in [('1961-2019', decomp_full, 1961),
                              ('1961-1980', decomp_61_80, 1961),
                              ('1980-2000', decomp_80_00, 1980),
                              ('2000-2019', decomp_00_19, 2000)]:
-    merged = pd.merge(decomp[decomp['year'] > start], yearly[['year', 'dlnA']], on='year')
-    residual = (merged['total'] - merged['dlnA']).abs().max()
+    sub = decomp[decomp['year'] > start].set_index('year')
+    residual = (sub['total'] - yearly_by_year['dlnA'].reindex(sub.index)).abs().max()
     print(f'Step 2 identity ({name}) — max residual: {residual:.2e}')
     assert residual < 1e-10, f'Step 2 identity fails for {name}'
 
@@ -879,8 +954,9 @@ for name, dlp, start in [('1961-2019', decomp_full_lp, 1961),
                           ('1961-1980', decomp_61_80_lp, 1961),
                           ('1980-2000', decomp_80_00_lp, 1980),
                           ('2000-2019', decomp_00_19_lp, 2000)]:
-    merged = pd.merge(dlp[dlp['year'] > start], yearly[['year', 'tfp_contrib']], on='year')
-    residual = (merged['within_lp'] + merged['baumol_lp'] - merged['tfp_contrib']).abs().max()
+    sub = dlp[dlp['year'] > start].set_index('year')
+    residual = (sub['within_lp'] + sub['baumol_lp']
+                - yearly_by_year['tfp_contrib'].reindex(sub.index)).abs().max()
     print(f'3-term amplification ({name}) — max residual: {residual:.2e}')
     assert residual < 1e-10, f'3-term amplification fails for {name}'
 
@@ -892,21 +968,15 @@ PERIODS = [(1961, 2019), (1961, 1980), (1980, 2000), (2000, 2019)]
 DECOMPS = [decomp_full, decomp_61_80, decomp_80_00, decomp_00_19]
 
 # Panel A: Labor productivity decomposition
-lp      = [annualize(yearly, 'dlnYL', s, e) for s, e in PERIODS]
-tfp_c   = [annualize(yearly, 'tfp_contrib', s, e) for s, e in PERIODS]
-ky_c    = [annualize(yearly, 'ky_contrib', s, e) for s, e in PERIODS]
-tfp_kl_c = [annualize(yearly, 'tfp_kl', s, e) for s, e in PERIODS]
-kl_c     = [annualize(yearly, 'kl_contrib', s, e) for s, e in PERIODS]
+lp, tfp_c, ky_c, tfp_kl_c, kl_c = annualize_columns(
+    yearly, ['dlnYL', 'tfp_contrib', 'ky_contrib', 'tfp_kl', 'kl_contrib'], PERIODS)
 
 # Panel B: TFP decomposition
-tfp_agg = [annualize_decomp(d, 'total', s, e) for d, (s, e) in zip(DECOMPS, PERIODS)]
-within  = [annualize_decomp(d, 'within', s, e) for d, (s, e) in zip(DECOMPS, PERIODS)]
-baumol  = [annualize_decomp(d, 'baumol', s, e) for d, (s, e) in zip(DECOMPS, PERIODS)]
+tfp_agg, within, baumol = annualize_decomps(DECOMPS, ['total', 'within', 'baumol'], PERIODS)
 
 # 3-term LP decomposition
 DECOMPS_LP = [decomp_full_lp, decomp_61_80_lp, decomp_80_00_lp, decomp_00_19_lp]
-within_lp = [annualize_decomp(d, 'within_lp', s, e) for d, (s, e) in zip(DECOMPS_LP, PERIODS)]
-baumol_lp = [annualize_decomp(d, 'baumol_lp', s, e) for d, (s, e) in zip(DECOMPS_LP, PERIODS)]
+within_lp, baumol_lp = annualize_decomps(DECOMPS_LP, ['within_lp', 'baumol_lp'], PERIODS)
 
 lp_slowdown_mid_late = lp[2] - lp[3]
 within_slowdown_mid_late = within_lp[2] - within_lp[3]
@@ -1122,13 +1192,14 @@ finalize_figure(fig, ax, FIG_DIR / 'note_labor_productivity.png')
 
 fig, ax = setup_figure()
 
-tfp_total_index = 100 * np.exp(decomp_full['total'].cumsum())
-tfp_within_index = 100 * np.exp(decomp_full['within'].cumsum())
+decomp_years = decomp_full['year'].to_numpy()
+tfp_total_index = 100 * np.exp(np.cumsum(decomp_full['total'].to_numpy()))
+tfp_within_index = 100 * np.exp(np.cumsum(decomp_full['within'].to_numpy()))
 
-ax.plot(decomp_full['year'], tfp_total_index,
+ax.plot(decomp_years, tfp_total_index,
         label='Total', color=PALETTE[0], linewidth=2)
 # Counterfactual: TFP if economic structure stayed at 1961 shares.
-ax.plot(decomp_full['year'], tfp_within_index,
+ax.plot(decomp_years, tfp_within_index,
         label=r"Sans effet de r\'eallocation", color=PALETTE[1], linewidth=2)
 
 ax.set_xlim(1961, 2019)
@@ -1146,18 +1217,18 @@ ax.yaxis.set_label_coords(0, 1.02)
 ax.grid(True, which='major', axis='y', color='gray', linestyle=':', linewidth=0.5)
 
 green_x = 2007.5
-green_y = np.interp(green_x, decomp_full['year'], tfp_within_index) + 2.4
+green_y = np.interp(green_x, decomp_years, tfp_within_index) + 2.4
 blue_x = 2013.8
-blue_y = np.interp(blue_x, decomp_full['year'], tfp_total_index) + 1.8
+blue_y = np.interp(blue_x, decomp_years, tfp_total_index) + 1.8
 label_box = dict(facecolor='white', edgecolor='none', alpha=0.9, pad=0.2)
 
 ax.text(green_x, green_y,
         r"Sans effet de r\'eallocation"
-        + f' ({format_fr_number(tfp_within_index.iloc[-1], 0)})',
+        + f' ({format_fr_number(tfp_within_index[-1], 0)})',
         color=PALETTE[1], fontsize=9.5, fontweight='bold', ha='left', va='center',
         bbox=label_box)
 ax.text(blue_x, blue_y,
-        f'Total ({format_fr_number(tfp_total_index.iloc[-1], 0)})',
+        f'Total ({format_fr_number(tfp_total_index[-1], 0)})',
         color=PALETTE[0], fontsize=9.5, fontweight='bold', ha='left', va='center',
         bbox=label_box)
 
@@ -1247,14 +1318,20 @@ for label, panel, _ in panel_data:
 # y = change in nominal VA share (s_{2019} - s_{1961}, in percentage points)
 # The expected negative correlation is the Baumol effect: high-TFP-growth
 # industries see falling relative prices and declining nominal VA shares.
-s_1961 = df[df['year'] == 1961].set_index('naics')['s']
-s_2019 = df[df['year'] == 2019].set_index('naics')['s']
-cum_tfp_by_industry = df[df['year'] > 1961].groupby('naics')['tfp_growth'].sum()
+# All three series are reindexed to one naics index, so the DataFrame is
+# built from plain arrays without any alignment.
+naics_idx = pd.Index(df['naics'].cat.categories, name='naics')
+s_1961 = df[df['year'] == 1961].set_index('naics')['s'].reindex(naics_idx).to_numpy()
+s_2019 = df[df['year'] == 2019].set_index('naics')['s'].reindex(naics_idx).to_numpy()
+cum_tfp_by_industry = (
+    df[df['year'] > 1961].groupby('naics', sort=False, observed=True)['tfp_growth'].sum()
+    .reindex(naics_idx).to_numpy()
+)
 
 scatter_data = pd.DataFrame({
     'cum_tfp': 100 * cum_tfp_by_industry,
     'delta_s': 100 * (s_2019 - s_1961)            # percentage points
-}).dropna()
+}, index=naics_idx).dropna()
 
 fig, ax = setup_figure()
 
@@ -1262,8 +1339,13 @@ ax.scatter(scatter_data['cum_tfp'], scatter_data['delta_s'],
            color=PALETTE[0], s=50, alpha=0.7, zorder=3,
            edgecolors='white', linewidth=0.5)
 
-# OLS regression line spanning the full x-axis domain
-z = np.polyfit(scatter_data['cum_tfp'], scatter_data['delta_s'], 1)
+# OLS regression line spanning the full x-axis domain (closed-form
+# slope and intercept; z follows np.polyfit's [slope, intercept] order)
+x_obs = scatter_data['cum_tfp'].to_numpy()
+y_obs = scatter_data['delta_s'].to_numpy()
+x_dev = x_obs - x_obs.mean()
+slope = (x_dev * (y_obs - y_obs.mean())).sum() / (x_dev ** 2).sum()
+z = np.array([slope, y_obs.mean() - slope * x_obs.mean()])
 
 # Draw regression line after autoscaling so it spans the full domain
 xlim = ax.get_xlim()
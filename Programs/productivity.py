@@ -5,6 +5,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib import rc
 from stats_can import StatsCan
+from statscan_cache import cached_table
 from datetime import datetime
 from scipy import sparse
 import xlrd
@@ -67,7 +68,7 @@ industry_to_naics = {
 ########################################################################
 
 # Retrieve the data from Table 36-10-0217-01
-df = sc.table_to_df('36-10-0217-01')
+df = cached_table(sc, '36-10-0217-01')
 
 # Drop several sectors and industries
 drop_list = [
@@ -106,10 +107,9 @@ relevant_vars = [
 ]
 df = df[df['Multifactor productivity and related variables'].isin(relevant_vars)]
 
-# Reshape the DataFrame
-df = df.pivot_table(index=['North American Industry Classification System (NAICS)', 'REF_DATE'], 
-                    columns='Multifactor productivity and related variables', 
-                    values='VALUE').reset_index().rename_axis(None, axis=1)
+# Reshape the DataFrame (each industry, date and variable cell is unique, so unstack needs no aggregation)
+df = df.set_index(['North American Industry Classification System (NAICS)', 'REF_DATE', 'Multifactor productivity and related variables'])['VALUE'] \
+       .unstack('Multifactor productivity and related variables').reset_index().rename_axis(None, axis=1)
 
 # Rename the columns
 df = df.rename(columns={
@@ -358,6 +358,10 @@ df_2000_2019_no_stagnant = pd.merge(df_2000_2019_no_stagnant, df_temp.groupby('y
 df_2000_2019_no_stagnant.loc[0, :] = 0
 df_2000_2019_no_stagnant['total'] = df_2000_2019_no_stagnant['productivity'] + df_2000_2019_no_stagnant['baumol'] + df_2000_2019_no_stagnant['capital'] + df_2000_2019_no_stagnant['labor']
 
+# Cumulate the terms plotted in the figures below once
+cum_1961_2019 = df_1961_2019[['productivity', 'baumol', 'capital', 'labor', 'total']].cumsum()
+cum_1961_2019_no_oge = df_1961_2019_no_oge[['baumol', 'total']].cumsum()
+
 ########################################################################
 # Plot the TFP Baumol effect                                           # 
 ########################################################################
@@ -370,8 +374,8 @@ fig.patch.set_alpha(0.0)
 ax.patch.set_alpha(0.0)
 
 # Plot the data
-ax.plot(df_1961_2019['year'], 100 * (df_1961_2019['total'].cumsum() + 1), label='Total', color=palette[0], linewidth=2)
-ax.plot(df_1961_2019['year'], 100 * (df_1961_2019['total'].cumsum() - df_1961_2019['baumol'].cumsum() + 1), label='Without Baumol', color=palette[1], linewidth=2)
+ax.plot(df_1961_2019['year'], 100 * (cum_1961_2019['total'] + 1), label='Total', color=palette[0], linewidth=2)
+ax.plot(df_1961_2019['year'], 100 * (cum_1961_2019['total'] - cum_1961_2019['baumol'] + 1), label='Without Baumol', color=palette[1], linewidth=2)
 
 # Set the horizontal axis
 ax.set_xlim(1961, 2019)
@@ -414,10 +418,10 @@ fig.patch.set_alpha(0.0)
 ax.patch.set_alpha(0.0)
 
 # Plot the data
-ax.plot(df_1961_2019['year'], 100 * (df_1961_2019['total'].cumsum() + 1), label='Total', color=palette[0], linewidth=2)
-ax.plot(df_1961_2019['year'], 100 * (df_1961_2019['total'].cumsum() - df_1961_2019['baumol'].cumsum() + 1), label='Without Baumol', color=palette[1], linewidth=2)
-ax.plot(df_1961_2019_no_oge['year'], 100 * (df_1961_2019_no_oge['total'].cumsum() + 1), label=r'Total (without O\&G)', color=palette[0], linewidth=2, linestyle='dotted')
-ax.plot(df_1961_2019_no_oge['year'], 100 * (df_1961_2019_no_oge['total'].cumsum() - df_1961_2019_no_oge['baumol'].cumsum() + 1), label=r'Without Baumol (without O\&G)', color=palette[1], linewidth=2, linestyle='dotted')
+ax.plot(df_1961_2019['year'], 100 * (cum_1961_2019['total'] + 1), label='Total', color=palette[0], linewidth=2)
+ax.plot(df_1961_2019['year'], 100 * (cum_1961_2019['total'] - cum_1961_2019['baumol'] + 1), label='Without Baumol', color=palette[1], linewidth=2)
+ax.plot(df_1961_2019_no_oge['year'], 100 * (cum_1961_2019_no_oge['total'] + 1), label=r'Total (without O\&G)', color=palette[0], linewidth=2, linestyle='dotted')
+ax.plot(df_1961_2019_no_oge['year'], 100 * (cum_1961_2019_no_oge['total'] - cum_1961_2019_no_oge['baumol'] + 1), label=r'Without Baumol (without O\&G)', color=palette[1], linewidth=2, linestyle='dotted')
 
 # Set the horizontal axis
 ax.set_xlim(1961, 2019)
@@ -459,9 +463,9 @@ fig.patch.set_alpha(0.0)
 ax.patch.set_alpha(0.0)
 
 # Plot the data
-ax.stackplot(df_1961_2019['year'], df_1961_2019[['productivity', 'labor']].cumsum().values.T, colors=palette[0:3], edgecolor='k', linewidth=0.5, zorder=1)
-ax.stackplot(df_1961_2019['year'], df_1961_2019[['baumol', 'capital']].cumsum().values.T, colors=palette[2:4], edgecolor='k', linewidth=0.5, zorder=1)
-ax.plot(df_1961_2019['year'], df_1961_2019['productivity'].cumsum() + df_1961_2019['baumol'].cumsum() + df_1961_2019['capital'].cumsum() + df_1961_2019['labor'].cumsum(), color='white', linestyle='dotted', linewidth=1.5, zorder=3)
+ax.stackplot(df_1961_2019['year'], cum_1961_2019[['productivity', 'labor']].values.T, colors=palette[0:3], edgecolor='k', linewidth=0.5, zorder=1)
+ax.stackplot(df_1961_2019['year'], cum_1961_2019[['baumol', 'capital']].values.T, colors=palette[2:4], edgecolor='k', linewidth=0.5, zorder=1)
+ax.plot(df_1961_2019['year'], cum_1961_2019['productivity'] + cum_1961_2019['baumol'] + cum_1961_2019['capital'] + cum_1961_2019['labor'], color='white', linestyle='dotted', linewidth=1.5, zorder=3)
 
 # Set the horizontal axis
 ax.set_xlim(1961, 2019)
@@ -0,0 +1,29 @@
+"""
+Parquet cache of the Statistics Canada tables shared by the scripts in Programs/.
+
+Every script reads its StatsCan tables through cached_table(), so they all
+share one cache directory (Data/cache at the project root, whatever the
+working directory) and one cache lifetime.
+"""
+
+import time
+from pathlib import Path
+import pandas as pd
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / 'Data' / 'cache'
+CACHE_DAYS = 30
+
+
+def cached_table(sc, table_id):
+    """Read a Statistics Canada table from the parquet cache.
+
+    The table is fetched with the StatsCan client sc, and the cache
+    refreshed, when the cached copy is missing or older than CACHE_DAYS.
+    """
+    path = CACHE_DIR / f'{table_id}.parquet'
+    if path.exists() and time.time() - path.stat().st_mtime < CACHE_DAYS * 24 * 60 * 60:
+        return pd.read_parquet(path)
+    df = sc.table_to_df(table_id)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(path, compression='zstd')
+    return df